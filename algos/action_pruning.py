@@ -0,0 +1,130 @@
+import random
+
+import numpy as np
+
+class ActionPruner:
+    """
+    学习每个状态上"没用"的动作，DFS 和 Q-Learning 共用。
+
+    一次转移 (s, a) -> s' 算冗余：s' == s (空操作)，或者 s' 已经由 s 上的另一个动作到达过 (等价动作)。
+    - 已观测过的 (s, a) 直接用观测结果
+    - 没观测过的 (s, a) 按动作 a 在其它状态上的统计推断：至少 min_evidence 次观测且冗余比例 >= threshold
+      (例如日期选择器里的日期按钮，在几个月份上都是空操作后，新月份上也默认是空操作)
+
+    冗余动作不直接删掉：skip() 以 probe_rate 的概率放行 (探测它是否仍然冗余)，
+    DFS 把被跳过的状态记下来，正常 frontier 走完之后 release() 再补上。
+    """
+    def __init__(self, num_actions, threshold=0.9, min_evidence=3, probe_rate=0.05):
+        self.num_actions = num_actions
+        self.threshold = threshold
+        self.min_evidence = min_evidence
+        self.probe_rate = probe_rate
+        # 跨状态统计：每个动作被观测的 (s, a) 个数 / 其中冗余的个数
+        self.tried = np.zeros(num_actions, dtype=np.int64)
+        self.redundant = np.zeros(num_actions, dtype=np.int64)
+        # {(s, a): 是否冗余}，{s: {s': 第一个到达 s' 的动作}}
+        self.known = {}
+        self.outcomes = {}
+        # 有动作被跳过的状态 / 已放开剪枝的状态
+        self.deferred = set()
+        self.released = set()
+        self.skipped = 0
+        self.probes = 0
+        self._journal = None
+
+    def observe(self, state, action, next_state):
+        action = int(action)
+        reached = self.outcomes.setdefault(state, {})
+        new_outcome = next_state not in reached
+        first = reached.setdefault(next_state, action)
+        is_redundant = next_state == state or first != action
+
+        key = (state, action)
+        previous = self.known.get(key)
+        if previous is None:
+            self.tried[action] += 1
+            self.redundant[action] += is_redundant
+        elif previous != is_redundant:
+            # 探测发现行为变了 (环境变化)，修正跨状态统计
+            self.redundant[action] += 1 if is_redundant else -1
+        self.known[key] = is_redundant
+        # 重复观测不改变任何东西，只记录有变化的 (Q-Learning 每步都会调用)
+        if self._journal is not None and (previous != is_redundant or new_outcome):
+            self._journal.append([state, action, next_state])
+
+    def predicted(self, action):
+        """动作在其它状态上的统计是否足以认定为冗余"""
+        n = self.tried[action]
+        return n >= self.min_evidence and self.redundant[action] >= self.threshold * n
+
+    def is_redundant(self, state, action):
+        known = self.known.get((state, int(action)))
+        return self.predicted(action) if known is None else known
+
+    def skip(self, state, action):
+        """DFS 用：这个动作现在是否跳过 (被 release 的状态不再剪枝)"""
+        if state in self.released or not self.is_redundant(state, action):
+            return False
+        if random.random() < self.probe_rate:
+            self.probes += 1
+            return False
+        self.skipped += 1
+        self.deferred.add(state)
+        return True
+
+    def deferred_at(self, state):
+        """状态上有被跳过、还没补上的动作"""
+        return state in self.deferred and state not in self.released
+
+    def release(self, state):
+        """补漏：这个状态不再剪枝"""
+        self.released.add(state)
+
+    def explore_candidates(self, state):
+        """
+        Q-Learning 随机探索时的候选动作：
+        有用的 + 没试过且不像冗余的；后者为空时才加入没试过但像冗余的；已知冗余的只按概率探测
+        """
+        useful, fresh, doubtful = [], [], []
+        for action in range(self.num_actions):
+            known = self.known.get((state, action))
+            if known is None:
+                (doubtful if self.predicted(action) else fresh).append(action)
+            elif not known:
+                useful.append(action)
+            elif random.random() < self.probe_rate:
+                self.probes += 1
+                useful.append(action)
+            else:
+                self.skipped += 1
+        candidates = useful + fresh
+        if not fresh:
+            candidates += doubtful
+        return candidates or list(range(self.num_actions))
+
+    def get_stats(self):
+        return {
+            "pruned_actions": int(sum(self.predicted(a) for a in range(self.num_actions))),
+            "skipped": self.skipped,
+            "probes": self.probes,
+            "deferred_states": len(self.deferred),
+            "released_states": len(self.released),
+        }
+
+    # === checkpoint：观测按增量写，恢复时按顺序重放 ===
+    def enable_journal(self):
+        self._journal = []
+
+    def checkpoint_state(self):
+        delta, self._journal = self._journal, []
+        snapshot = {"deferred": list(self.deferred), "released": list(self.released),
+                    "skipped": self.skipped, "probes": self.probes}
+        return delta, snapshot
+
+    def restore_checkpoint(self, delta, snapshot):
+        for state, action, next_state in delta:
+            self.observe(state, action, next_state)
+        self.deferred = set(snapshot["deferred"])
+        self.released = set(snapshot["released"])
+        self.skipped = snapshot["skipped"]
+        self.probes = snapshot["probes"]
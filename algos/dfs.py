@@ -1,4 +1,12 @@
-import copy
+from array import array
+from collections import deque
+
+import numpy as np
+
+from algos.action_pruning import ActionPruner
+from algos.model_cache import TransitionModel, load_model_if_exists
+from utils.checkpoint import SessionCheckpointer
+from utils.step_profiler import phase_timer
 
 class DFSAgent:
     def __init__(self):
@@ -8,49 +16,510 @@ class DFSAgent:
         self.stack = [] 
         # 局部模型: {state_id: {action: next_state_id}}
         self.model = {} 
+        # 上一次 session 导出的先验模型 (TransitionModel，只读)
+        self.prior = None
+        # 动作剪枝 (ActionPruner，可选)
+        self.pruner = None
+        # checkpoint 增量日志 (enable_journal 之后才记录)
+        self._journal = None
 
     def update_model(self, state, action, next_state):
         if state not in self.model:
             self.model[state] = {}
         self.model[state][action] = next_state
+        if self.pruner is not None:
+            self.pruner.observe(state, action, next_state)
+        if self._journal is not None:
+            self._journal["model"].append([state, int(action), next_state])
+
+    # === 栈 / 路径接口 (与 CompactDFSAgent 保持一致) ===
+    def root_path(self):
+        return []
+
+    def make_path(self, actions):
+        return list(actions)
+
+    def extend_path(self, path, action):
+        return path + [action]
+
+    def path_actions(self, path):
+        return path
+
+    def push(self, path, state):
+        self.stack.append((path, state))
+
+    def pop(self):
+        return self.stack.pop()
+
+    def stack_size(self):
+        return len(self.stack)
+
+    def visit(self, state):
+        """标记访问，新节点返回 True"""
+        if state in self.visited_states:
+            return False
+        self.visited_states.add(state)
+        if self._journal is not None:
+            self._journal["visited"].append(state)
+        return True
+
+    def untried_action(self, state, explored_edges, num_actions):
+        """按动作编号顺序找第一个没探索过的动作，O(A)；开启剪枝时跳过冗余动作"""
+        for action in range(num_actions):
+            # 检查是否已探索 (本次 session 或先验模型)
+            if (state, action) not in explored_edges and not self.knows(state, action):
+                if self.pruner is not None and self.pruner.skip(state, action):
+                    continue
+                return action
+        return None
+
+    def shortcut(self, state, target_state):
+        """当前位置是否有已知边直接连向目标位置"""
+        for act, nxt in self.successors(state):
+            if nxt == target_state:
+                return act
+        return None
+
+    def knows(self, state, action):
+        """这条边在先验模型里已经探索过"""
+        return self.prior is not None and self.prior.lookup(state, action) is not None
+
+    def successors(self, state):
+        """本次 session 的模型优先，其次是先验模型"""
+        edges = dict(self.prior.successors(state)) if self.prior is not None else {}
+        edges.update(self.model.get(state, {}))
+        return edges.items()
+
+    def load_model(self, path, mmap=True):
+        self.prior = load_model_if_exists(path, mmap=mmap)
+        if self.prior is not None:
+            self.visited_states.update(self.prior.states.tolist())
+        return self.prior
+
+    def save_model(self, path, num_actions=0):
+        """把先验模型和本次学到的边合并后导出"""
+        merged = {}
+        if self.prior is not None:
+            for s in self.prior.states.tolist():
+                merged[s] = dict(self.prior.successors(s))
+        for s, edges in self.model.items():
+            merged.setdefault(s, {}).update(edges)
+        return TransitionModel.from_dict(merged, self.visited_states, num_actions).save(path)
+
+    # === checkpoint (见 utils/checkpoint.py) ===
+    def enable_journal(self, seed=True):
+        """seed=True 时把当前已有的内容也写进第一条增量"""
+        self._journal = {"model": [], "visited": []}
+        if self.pruner is not None:
+            self.pruner.enable_journal()
+        if seed:
+            for s, edges in self.model.items():
+                for a, nxt in edges.items():
+                    self._journal["model"].append([s, int(a), nxt])
+            self._journal["visited"].extend(self.visited_states)
+
+    def checkpoint_state(self):
+        """返回 (增量, 快照)；栈每次整体写入"""
+        delta, self._journal = self._journal, {"model": [], "visited": []}
+        snapshot = {"stack": [[list(p), s] for p, s in self.stack]}
+        _checkpoint_pruner(self.pruner, delta, snapshot)
+        return delta, snapshot
+
+    def restore_checkpoint(self, state):
+        # 剪枝器的观测单独恢复，这里先摘掉，避免 update_model 重复观测
+        pruner, self.pruner = self.pruner, None
+        for s, a, nxt in state["delta"].get("model", []):
+            self.update_model(s, a, nxt)
+        self.pruner = _restore_pruner(pruner, state)
+        self.visited_states.update(state["delta"].get("visited", []))
+        self.stack = [(list(p), s) for p, s in state["snapshot"]["stack"]]
+
+class CompactDFSAgent:
+    """
+    数组版 DFS Agent，内存可预估 (约 states * (4 * A + 13) 字节，外加 ID 映射)：
+    - 状态用稠密编号，next_state 为 int32 矩阵 [n_states, A]，-1 表示未知
+    - cursor[s] 指向下一个未尝试的动作，找下一个动作是均摊 O(1)
+    - 路径存成前缀树 (parent, action)，入栈只存节点编号，不复制路径
+    """
+    def __init__(self, num_actions, capacity=1024):
+        self.num_actions = num_actions
+        self.state_index = {} # 原始状态 ID -> 稠密编号
+        self.n_states = 0
+        self.state_ids = np.empty(capacity, dtype=np.int64)
+        self.next_state = np.full((capacity, num_actions), -1, dtype=np.int32)
+        self.cursor = np.zeros(capacity, dtype=np.int32)
+        self.visited = np.zeros(capacity, dtype=bool)
+        # 路径前缀树，节点 0 是空路径
+        self.path_parent = array('l', [-1])
+        self.path_action = array('l', [-1])
+        # 栈：路径节点编号 / 稠密状态编号
+        self.stack_paths = array('l')
+        self.stack_states = array('l')
+        self.prior = None
+        self.pruner = None
+        # 剪枝跳过的动作 {稠密编号: deque[动作]}，cursor 越过它们，行走完之后再按顺序补查
+        self.deferred = {}
+        self._journal = None
+        self._path_mark = 1
+
+    def _grow(self):
+        cap = len(self.state_ids) * 2
+        self.state_ids = np.resize(self.state_ids, cap)
+        next_state = np.full((cap, self.num_actions), -1, dtype=np.int32)
+        next_state[:self.n_states] = self.next_state[:self.n_states]
+        self.next_state = next_state
+        self.cursor = np.concatenate([self.cursor, np.zeros(cap - len(self.cursor), dtype=np.int32)])
+        self.visited = np.concatenate([self.visited, np.zeros(cap - len(self.visited), dtype=bool)])
+
+    def _dense(self, state):
+        idx = self.state_index.get(state)
+        if idx is None:
+            if self.n_states == len(self.state_ids):
+                self._grow()
+            idx = self.n_states
+            self.state_index[state] = idx
+            self.state_ids[idx] = state
+            self.n_states += 1
+        return idx
+
+    def memory_bytes(self):
+        return (self.state_ids.nbytes + self.next_state.nbytes + self.cursor.nbytes + self.visited.nbytes
+                + (len(self.path_parent) + len(self.path_action)) * self.path_parent.itemsize
+                + (len(self.stack_paths) + len(self.stack_states)) * self.stack_paths.itemsize)
+
+    def update_model(self, state, action, next_state):
+        self.next_state[self._dense(state), action] = self._dense(next_state)
+        if self.pruner is not None:
+            self.pruner.observe(state, action, next_state)
+        if self._journal is not None:
+            self._journal["model"].append([state, int(action), next_state])
+
+    def root_path(self):
+        return 0
+
+    def make_path(self, actions):
+        path = 0
+        for a in actions:
+            path = self.extend_path(path, a)
+        return path
+
+    def extend_path(self, path, action):
+        self.path_parent.append(path)
+        self.path_action.append(action)
+        return len(self.path_parent) - 1
+
+    def path_actions(self, path):
+        actions = []
+        while path > 0:
+            actions.append(self.path_action[path])
+            path = self.path_parent[path]
+        actions.reverse()
+        return actions
+
+    @property
+    def stack(self):
+        """(路径节点, 原始状态 ID) 列表，仅用于查看/调试"""
+        states = self.state_ids[np.asarray(self.stack_states, dtype=np.int64)].tolist()
+        return list(zip(self.stack_paths, states))
 
-def run_dfs_session(env, animator=None, total_budget=100, **kwargs):
-    agent = DFSAgent()
+    def push(self, path, state):
+        self.stack_paths.append(path)
+        self.stack_states.append(self._dense(state))
+
+    def pop(self):
+        return self.stack_paths.pop(), int(self.state_ids[self.stack_states.pop()])
+
+    def stack_size(self):
+        return len(self.stack_paths)
+
+    def visit(self, state):
+        idx = self._dense(state)
+        if self.visited[idx]:
+            return False
+        self.visited[idx] = True
+        if self._journal is not None:
+            self._journal["visited"].append(state)
+        return True
+
+    @property
+    def visited_states(self):
+        return set(self.state_ids[:self.n_states][self.visited[:self.n_states]].tolist())
+
+    def knows(self, state, action):
+        """这条边在先验模型里已经探索过"""
+        return self.prior is not None and self.prior.lookup(state, action) is not None
+
+    def _tried(self, state, row, action, explored_edges):
+        # 和 DFSAgent 一样以 env 记录的边 + 先验模型为准；不传 explored_edges 时退回看本地模型
+        if explored_edges is None:
+            return row[action] != -1
+        return (state, action) in explored_edges or self.knows(state, action)
+
+    def untried_action(self, state, explored_edges=None, num_actions=None):
+        """
+        cursor 只会前进 (边一旦探索过就不会变回未探索)，均摊 O(1)。
+        被剪枝跳过的动作放进 deferred 并越过；行走完之后只看 deferred 的队首，
+        放行 (探测 / release) 时返回它，队首探索过之后出队。
+        """
+        idx = self._dense(state)
+        row = self.next_state[idx]
+        c = int(self.cursor[idx])
+        while c < self.num_actions:
+            if not self._tried(state, row, c, explored_edges):
+                if self.pruner is None or not self.pruner.skip(state, c):
+                    break
+                self.deferred.setdefault(idx, deque()).append(c)
+            c += 1
+        self.cursor[idx] = c
+        if c < self.num_actions:
+            return c
+        queue = self.deferred.get(idx)
+        while queue and self._tried(state, row, queue[0], explored_edges):
+            queue.popleft()
+        if not queue:
+            self.deferred.pop(idx, None)
+            return None
+        return queue[0] if not self.pruner.skip(state, queue[0]) else None
+
+    def successors(self, state):
+        idx = self.state_index.get(state)
+        if idx is None:
+            return []
+        row = self.next_state[idx]
+        acts = np.flatnonzero(row >= 0)
+        return zip(acts.tolist(), self.state_ids[row[acts]].tolist())
+
+    def shortcut(self, state, target_state):
+        idx = self.state_index.get(state)
+        tgt = self.state_index.get(target_state)
+        if idx is None or tgt is None:
+            return None
+        hits = np.flatnonzero(self.next_state[idx] == tgt)
+        return int(hits[0]) if len(hits) else None
+
+    def load_model(self, path, mmap=True):
+        """先验模型整体写进 next_state 矩阵 (向量化)"""
+        self.prior = load_model_if_exists(path, mmap=mmap)
+        if self.prior is None:
+            return None
+        states = np.union1d(self.prior.states, self.prior.next_states)
+        dense = np.array([self._dense(s) for s in states.tolist()], dtype=np.int64)
+        src = np.repeat(np.asarray(self.prior.states), np.diff(self.prior.indptr))
+        act = np.asarray(self.prior.actions)
+        nxt = np.asarray(self.prior.next_states)
+        keep = act < self.num_actions
+        self.next_state[dense[np.searchsorted(states, src[keep])], act[keep]] = \
+            dense[np.searchsorted(states, nxt[keep])]
+        # 同 DFSAgent：只有先验里的 states 算访问过，只作为后继出现的状态还要自己去展开
+        self.visited[dense[np.searchsorted(states, self.prior.states)]] = True
+        return self.prior
+
+    def to_transition_model(self):
+        n = self.n_states
+        rows = self.next_state[:n]
+        known = rows >= 0
+        # 同 TransitionModel.from_dict：有出边或访问过的状态才导出
+        idx = np.nonzero(known.any(axis=1) | self.visited[:n])[0]
+        order = idx[np.argsort(self.state_ids[idx], kind="stable")]
+        rows, known = rows[order], known[order]
+        indptr = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(known.sum(axis=1), out=indptr[1:])
+        r, a = np.nonzero(known)
+        return TransitionModel(self.state_ids[order], indptr, a.astype(np.int32),
+                               self.state_ids[rows[r, a]].astype(np.int64), self.num_actions)
+
+    def save_model(self, path, num_actions=0):
+        return self.to_transition_model().save(path)
+
+    # === checkpoint (见 utils/checkpoint.py) ===
+    def enable_journal(self, seed=True):
+        self._journal = {"model": [], "visited": []}
+        if self.pruner is not None:
+            self.pruner.enable_journal()
+        self._path_mark = 1 if seed else len(self.path_parent)
+        if seed:
+            n = self.n_states
+            r, a = np.nonzero(self.next_state[:n] >= 0)
+            ids = self.state_ids
+            self._journal["model"] = np.stack([ids[r], a, ids[self.next_state[r, a]]], axis=1).tolist()
+            self._journal["visited"] = ids[:n][self.visited[:n]].tolist()
+
+    def checkpoint_state(self):
+        """路径前缀树只追加，所以也按增量写；栈是整数数组，整体写入"""
+        delta, self._journal = self._journal, {"model": [], "visited": []}
+        delta["path_parent"] = self.path_parent[self._path_mark:].tolist()
+        delta["path_action"] = self.path_action[self._path_mark:].tolist()
+        self._path_mark = len(self.path_parent)
+        snapshot = {"stack_paths": self.stack_paths.tolist(),
+                    "stack_states": self.state_ids[np.asarray(self.stack_states, dtype=np.int64)].tolist()}
+        _checkpoint_pruner(self.pruner, delta, snapshot)
+        return delta, snapshot
+
+    def restore_checkpoint(self, state):
+        pruner, self.pruner = self.pruner, None
+        for s, a, nxt in state["delta"].get("model", []):
+            self.update_model(s, a, nxt)
+        self.pruner = _restore_pruner(pruner, state)
+        for s in state["delta"].get("visited", []):
+            self.visit(s)
+        self.path_parent.extend(state["delta"].get("path_parent", []))
+        self.path_action.extend(state["delta"].get("path_action", []))
+        self.stack_paths = array('l')
+        self.stack_states = array('l')
+        for path, s in zip(state["snapshot"]["stack_paths"], state["snapshot"]["stack_states"]):
+            self.push(path, s)
+
+def _known_path(agent, start_state, target_state):
+    """在已知模型上 BFS 找 start -> target 的最短动作序列，找不到返回 None"""
+    parents = {start_state: None}
+    frontier = [start_state]
+    while frontier and target_state not in parents:
+        nxt_frontier = []
+        for state in frontier:
+            for action, nxt in agent.successors(state):
+                if nxt not in parents:
+                    parents[nxt] = (state, action)
+                    nxt_frontier.append(nxt)
+        frontier = nxt_frontier
+    if target_state not in parents:
+        return None
+    actions = []
+    while parents[target_state] is not None:
+        target_state, action = parents[target_state]
+        actions.append(action)
+    actions.reverse()
+    return actions
+
+def _checkpoint_pruner(pruner, delta, snapshot):
+    if pruner is not None:
+        delta["prune"], snapshot["prune"] = pruner.checkpoint_state()
+
+def _restore_pruner(pruner, state):
+    if pruner is not None and "prune" in state["snapshot"]:
+        pruner.restore_checkpoint(state["delta"].get("prune", []), state["snapshot"]["prune"])
+    return pruner
+
+def run_dfs_session(env, animator=None, total_budget=100, model_path=None, save_model_path=None,
+                    backend="dict", checkpoint_path=None, checkpoint_every=1000, prune=False, **kwargs):
+    """
+    model_path: 从之前导出的模型热启动，只在未知边上花预算。
+    save_model_path: session 结束后把学到的模型导出 (.npz)。
+    backend: "dict" 使用 DFSAgent；"compact" 使用数组版 CompactDFSAgent。
+    checkpoint_path: 每 checkpoint_every 步追加一条 checkpoint；文件已存在时从最后一条继续。
+        env 需要是 EnvMonitor。热启动时恢复也要传同样的 model_path。
+    prune: True 或 ActionPruner 实例时开启动作剪枝：推断为冗余的动作先跳过，
+        栈空之后再回到这些状态补上 (见 algos/action_pruning.py)。
+    """
+    if backend == "compact":
+        agent = CompactDFSAgent(env.action_space.n)
+    elif backend == "dict":
+        agent = DFSAgent()
+    else:
+        raise ValueError(f"Unknown DFS backend: {backend}")
+    if model_path:
+        agent.load_model(model_path)
+    if prune:
+        agent.pruner = prune if isinstance(prune, ActionPruner) else ActionPruner(env.action_space.n)
+    
+    checkpointer = SessionCheckpointer(checkpoint_path, checkpoint_every) if checkpoint_path else None
+    phase = phase_timer(env)
+    _dfs_explore(env, agent, animator, total_budget, checkpointer)
     
+    if save_model_path:
+        phase("save_model")
+        agent.save_model(save_model_path, env.action_space.n)
+    phase(None)
+    return agent
+
+def _dfs_start(env, agent):
     start_state, _ = env.reset()
-    agent.visited_states.add(start_state)
+    agent.visit(start_state)
+    
+    # 热启动：先验模型里还有未知出边的状态压在栈底，按已知最短路径回放过去
+    if agent.prior is not None:
+        paths = agent.prior.shortest_paths(start_state)
+        seeds = [(paths[s], s) for s in agent.prior.frontier(env.action_space.n)
+                 if s in paths and s != start_state]
+        # 浅的状态后压栈，先被 pop
+        seeds.sort(key=lambda item: len(item[0]), reverse=True)
+        for actions, s in seeds:
+            agent.push(agent.make_path(actions), s)
     
     # stack 初始放入: (路径[], 状态ID)
-    agent.stack = [([], start_state)]
+    agent.push(agent.root_path(), start_state)
+    return start_state
+
+def _dfs_explore(env, agent, animator, total_budget, checkpointer=None):
+    # 阶段耗时 (env 带 StepProfiler 时)：start / checkpoint / release / backtrack / replay / explore / render
+    phase = phase_timer(env)
+    phase("start")
+    resumed = checkpointer.load() if checkpointer is not None else None
+    if resumed is not None:
+        # 从 checkpoint 恢复：env、计数器、agent 都回到保存时的状态
+        checkpointer.restore_env(env, resumed)
+        agent.restore_checkpoint(resumed)
+        start_state = resumed["snapshot"]["extra"]["start_state"]
+        current_physical_state = resumed["snapshot"]["extra"]["current_state"]
+        deferred = {s: (depth, path) for s, depth, path in resumed["snapshot"]["extra"].get("deferred", [])}
+    else:
+        if checkpointer is not None: checkpointer.attach(env)
+        start_state = _dfs_start(env, agent)
+        # 记录当前 Agent 物理上在哪里
+        current_physical_state = start_state
+        # 剪枝时有动作被跳过的分叉口 {state_id: (路径长度, path)}，栈空之后由浅到深补上
+        deferred = {}
     
-    # 记录当前 Agent 物理上在哪里
-    current_physical_state = start_state
+    if checkpointer is not None:
+        agent.enable_journal(seed=resumed is None)
     
-    if animator: animator.capture_frame(start_state, 0, 0)
+    if animator:
+        phase("render")
+        animator.capture_frame(current_physical_state, env.step_counter, 0)
     
     max_edges = env.get_max_edges()
 
-    while agent.stack and env.step_counter < total_budget:
+    while (agent.stack_size() or deferred) and env.budget_used < total_budget:
+        # 0. 到点就写 checkpoint (只在分叉口之间写，恢复后从这里继续)
+        if checkpointer is not None and checkpointer.due(env):
+            phase("checkpoint")
+            checkpointer.save(env, agent, {"start_state": start_state, "current_state": current_physical_state,
+                                           "deferred": [[s, d, p] for s, (d, p) in deferred.items()]})
+        
+        if not agent.stack_size():
+            # 正常 frontier 走完了，放开一个被剪枝的状态
+            phase("release")
+            state = min(deferred, key=lambda s: deferred[s][0])
+            depth, path = deferred.pop(state)
+            # 记录的路径可能绕了远路，补漏时用已知模型上的最短路径
+            actions = _known_path(agent, start_state, state)
+            if actions is not None and len(actions) < depth:
+                path = agent.make_path(actions)
+            agent.pruner.release(state)
+            agent.push(path, state)
+            # 当前 episode 可能早已超出深度，补漏统一从起点回放
+            env.reset()
+            current_physical_state = start_state
+        
         # 1. 取出下一个要探索的分叉口
-        target_path, target_state_id = agent.stack.pop()
+        phase("backtrack")
+        target_path, target_state_id = agent.pop()
         
         # === [核心修改] 智能回溯判断 ===
-        shortcut_action = None
-        
         # 检查当前物理位置是否有边直接连向目标位置
         # 场景：我们在 Detail 页，目标是 List 页，且存在 Detail->List 的边(Back)
-        if current_physical_state in agent.model:
-            for act, nxt in agent.model[current_physical_state].items():
-                if nxt == target_state_id:
-                    shortcut_action = act
-                    break
+        shortcut_action = agent.shortcut(current_physical_state, target_state_id)
+        if agent.pruner is not None and current_physical_state == target_state_id:
+            # 已经在目标位置，"捷径"只会是空操作，剪枝时不浪费这一步
+            shortcut_action = None
         
         if shortcut_action is not None:
             # A. 走捷径 (Smart Backtrack)
             # print(f"  [DFS] Shortcut found: {current_physical_state} -> {target_state_id} via act {shortcut_action}")
             # 使用 unwrapped 避免计入 Budget (或者计入，看你需求，通常回溯算赶路)
             # 这里为了严谨，回溯通常也算操作，我们计入 total_budget 消耗比较公平
-            current_physical_state, _, terminated, truncated, _ = env.step(shortcut_action)
+            # EnvMonitor 的 shortcut_step 和 step 一样计预算，只是归因时单独统计
+            step = getattr(env, 'shortcut_step', env.step)
+            current_physical_state, _, terminated, truncated, _ = step(shortcut_action)
             
             # 捷径走完，检查是否活着
             if terminated or truncated:
@@ -64,15 +533,24 @@ def run_dfs_session(env, animator=None, total_budget=100, **kwargs):
             
             # 如果当前就在目标位置（比如刚开始），就不用动
             if current_physical_state != target_state_id:
+                phase("replay")
                 env.reset()
                 current_physical_state = start_state
                 
                 valid_replay = True
-                for action in target_path:
-                    # Replay 使用 unwrapped，不消耗 Budget (或者快速通过)
-                    current_physical_state, _, terminated, truncated, _ = env.unwrapped.step(action)
-                    if (terminated or truncated) and len(env.explored_edges) < max_edges:
-                        valid_replay = False; break
+                # Replay 使用 unwrapped，不消耗 Budget (或者快速通过)；EnvMonitor 会单独计数
+                replay_actions = agent.path_actions(target_path)
+                if hasattr(env, 'replay_path'):
+                    # EnvMonitor：整段回放，内层有 MemoizedEnv 时跳过已知前缀
+                    if replay_actions:
+                        current_physical_state, terminated, truncated = env.replay_path(replay_actions)
+                        if (terminated or truncated) and len(env.explored_edges) < max_edges:
+                            valid_replay = False
+                else:
+                    for action in replay_actions:
+                        current_physical_state, _, terminated, truncated, _ = env.unwrapped.step(action)
+                        if (terminated or truncated) and len(env.explored_edges) < max_edges:
+                            valid_replay = False; break
                 
                 if not valid_replay: continue
 
@@ -81,21 +559,24 @@ def run_dfs_session(env, animator=None, total_budget=100, **kwargs):
         
         # 注意：此时 current_physical_state 应该等于 target_state_id
         # 为了鲁棒性，以 current_physical_state 为准
+        phase("explore")
         
-        while env.step_counter < total_budget:
+        while env.budget_used < total_budget:
             
-            found_action = None
-            for action in range(env.action_space.n):
-                # 检查是否已探索
-                if (current_physical_state, action) not in env.explored_edges:
-                    found_action = action
-                    break
+            found_action = agent.untried_action(current_physical_state, env.explored_edges, env.action_space.n)
             
-            if found_action is None: break # 没新路了，跳出内层循环 -> 回到栈处理
+            if found_action is None:
+                # 没新路了，跳出内层循环 -> 回到栈处理；有动作被剪枝跳过的话记下来稍后补
+                # (同一状态保留最短的路径，补的时候回放更短、也不容易被截断)
+                if agent.pruner is not None and agent.pruner.deferred_at(current_physical_state):
+                    depth = len(agent.path_actions(target_path))
+                    if depth < deferred.get(current_physical_state, (float('inf'),))[0]:
+                        deferred[current_physical_state] = (depth, target_path)
+                break
             
             # 压栈：保存当前路口，以便稍后回溯
             # 注意保存 (path, state_id)
-            agent.stack.append((copy.deepcopy(target_path), current_physical_state))
+            agent.push(target_path, current_physical_state)
             
             # 执行动作
             next_state, reward, terminated, truncated, _ = env.step(found_action)
@@ -103,17 +584,19 @@ def run_dfs_session(env, animator=None, total_budget=100, **kwargs):
             # [更新局部模型] 记下这条路，下次可能用来回溯
             agent.update_model(current_physical_state, found_action, next_state)
             
-            if animator: animator.capture_frame(next_state, env.step_counter, reward)
+            if animator:
+                phase("render")
+                animator.capture_frame(next_state, env.step_counter, reward)
+                phase("explore")
             
             # 更新路径变量
-            target_path.append(found_action)
+            target_path = agent.extend_path(target_path, found_action)
             prev_state = current_physical_state
             current_physical_state = next_state # 更新物理位置
             
             # 逻辑判定
-            if next_state not in agent.visited_states:
+            if agent.visit(next_state):
                 # 新节点：继续深入
-                agent.visited_states.add(next_state)
                 if terminated: return 
             else:
                 # 旧节点：撞墙了，结束深入
@@ -0,0 +1,125 @@
+import os
+from collections import deque
+
+import numpy as np
+
+from utils.array_store import save_arrays, load_arrays
+
+class TransitionModel:
+    """
+    持久化的转移模型 (CSR 格式)，用于跨 session 热启动。
+
+    states:      已知状态 ID，升序 (int64)
+    indptr:      states[i] 的出边位于 actions/next_states[indptr[i]:indptr[i+1]]
+    actions:     每行内按动作升序 (int32)
+    next_states: 对应的下一个状态 ID (int64)
+
+    所有查询都是二分查找，数组可以直接是 memmap，不需要转成 dict。
+    """
+    def __init__(self, states, indptr, actions, next_states, num_actions=0):
+        self.states = states
+        self.indptr = indptr
+        self.actions = actions
+        self.next_states = next_states
+        self.num_actions = int(num_actions)
+
+    @classmethod
+    def from_dict(cls, model, visited_states=(), num_actions=0):
+        """从 DFSAgent.model 的 {state: {action: next_state}} 构造"""
+        states = np.array(sorted(set(model.keys()) | set(visited_states)), dtype=np.int64)
+        counts = np.array([len(model.get(s, {})) for s in states.tolist()], dtype=np.int64)
+        indptr = np.zeros(len(states) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        actions = np.empty(indptr[-1], dtype=np.int32)
+        next_states = np.empty(indptr[-1], dtype=np.int64)
+        for i, s in enumerate(states.tolist()):
+            row = sorted(model.get(s, {}).items())
+            if row:
+                lo, hi = indptr[i], indptr[i + 1]
+                actions[lo:hi] = [a for a, _ in row]
+                next_states[lo:hi] = [n for _, n in row]
+        return cls(states, indptr, actions, next_states, num_actions)
+
+    def save(self, path):
+        return save_arrays(path, states=self.states, indptr=self.indptr, actions=self.actions,
+                           next_states=self.next_states, num_actions=np.array(self.num_actions))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        data = load_arrays(path, mmap=mmap)
+        return cls(data["states"], data["indptr"], data["actions"], data["next_states"],
+                   int(data["num_actions"]))
+
+    def __len__(self):
+        return len(self.actions)
+
+    def _row(self, state):
+        i = np.searchsorted(self.states, state)
+        if i < len(self.states) and self.states[i] == state:
+            return int(i)
+        return None
+
+    def has_state(self, state):
+        return self._row(state) is not None
+
+    def lookup(self, state, action):
+        """已知边返回 next_state，否则返回 None"""
+        i = self._row(state)
+        if i is None:
+            return None
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        j = lo + np.searchsorted(self.actions[lo:hi], action)
+        if j < hi and self.actions[j] == action:
+            return int(self.next_states[j])
+        return None
+
+    def successors(self, state):
+        """返回 [(action, next_state), ...]"""
+        i = self._row(state)
+        if i is None:
+            return []
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        return list(zip(self.actions[lo:hi].tolist(), self.next_states[lo:hi].tolist()))
+
+    def shortest_paths(self, start_state):
+        """BFS：从 start_state 出发到每个已知状态的最短动作序列 {state: [actions]}"""
+        paths = {start_state: []}
+        queue = deque([start_state])
+        while queue:
+            s = queue.popleft()
+            for a, nxt in self.successors(s):
+                if nxt not in paths:
+                    paths[nxt] = paths[s] + [a]
+                    queue.append(nxt)
+        return paths
+
+    def frontier(self, num_actions=None):
+        """还有未知出边的状态 (按状态 ID 升序)"""
+        n = num_actions or self.num_actions
+        counts = np.diff(self.indptr)
+        return self.states[counts < n].tolist()
+
+    def warm_start_q_table(self, q_table, repeat_reward=-0.1, unknown_value=1.0, gamma=0.9, sweeps=20):
+        """
+        用已知模型初始化 Q 表 (向量化的价值迭代)：
+        已知边视为重复探索 (repeat_reward)，已知状态上的未知动作给乐观值 unknown_value，
+        这样 Q-Learning 会优先沿已知路径走向还没探索过的边。
+        """
+        n_states, n_actions = q_table.shape
+        src = np.repeat(self.states, np.diff(self.indptr))
+        mask = (src >= 0) & (src < n_states) & (self.next_states >= 0) & \
+               (self.next_states < n_states) & (self.actions < n_actions)
+        src, act, dst = src[mask], np.asarray(self.actions)[mask], np.asarray(self.next_states)[mask]
+
+        known = self.states[(self.states >= 0) & (self.states < n_states)]
+        q_table[known, :] = unknown_value
+        for _ in range(sweeps):
+            v = q_table.max(axis=1)
+            q_table[src, act] = repeat_reward + gamma * v[dst]
+        return q_table
+
+def load_model_if_exists(path, mmap=True):
+    if path and os.path.exists(path):
+        return TransitionModel.load(path, mmap=mmap)
+    return None
@@ -0,0 +1,244 @@
+import multiprocessing as mp
+import queue
+import time
+
+import numpy as np
+
+# 一条边任务回放失败后最多重试几次
+MAX_TASK_RETRIES = 3
+# 入口状态上的任务：多入口 env 的 reset 随机落点，需要多试几次才能落到目标入口
+MAX_ROOT_RETRIES = 50
+
+def _worker_main(worker_id, make_env, max_depth, task_q, result_q, step_delay):
+    """
+    Worker 进程：持有自己的 env 实例，反复领取 (path, state, action) 任务。
+    物理位置不在 state 时 reset 并按 path 回放，然后执行 action 并发布这条边。
+    """
+    env = make_env(max_depth=max_depth)
+    current, _ = env.reset()
+    result_q.put(("start", worker_id, current))
+
+    while True:
+        task = task_q.get()
+        if task is None:
+            break
+        path, state, action = task
+
+        replayed = 0
+        if current != state:
+            current, _ = env.reset()
+            result_q.put(("start", worker_id, current))
+            for a in path:
+                if step_delay: time.sleep(step_delay)
+                current, _, terminated, truncated, _ = env.step(a)
+                replayed += 1
+                if terminated or truncated:
+                    break
+            if current != state:
+                # 回放没能到达目标 (深度截断 / 随机入口)，任务退回
+                result_q.put(("lost", worker_id, task, current, replayed))
+                current = None
+                continue
+
+        if step_delay: time.sleep(step_delay)
+        next_state, reward, terminated, truncated, _ = env.step(action)
+        success = bool(getattr(env, 'success', False))
+        result_q.put(("edge", worker_id, state, action, next_state, reward, terminated, success, replayed))
+        # episode 结束后必须 reset 才能继续
+        current = None if (terminated or truncated) else next_state
+
+def env_factory(raw):
+    """
+    worker 进程里创建 env 的构造器，spawn / forkserver 下要能 pickle：
+    env 提供 worker_factory 时用它 (文件图)，否则直接用 env 类。
+    """
+    factory = getattr(raw, 'worker_factory', None)
+    return factory() if factory is not None else type(raw)
+
+def merge_worker_counts(env, steps=0, resets=0, replays=0):
+    """把 worker 的操作汇总到 env 上：EnvMonitor 同时记账，普通 env 只累加步数"""
+    if hasattr(env, 'merge_worker_counts'):
+        env.merge_worker_counts(steps, resets, replays)
+    else:
+        env.step_counter = getattr(env, 'step_counter', 0) + steps
+        env.reset_counter = getattr(env, 'reset_counter', 0) + resets
+
+def run_parallel_dfs_session(env, animator=None, total_budget=100, num_workers=4, step_delay=0.0, **kwargs):
+    """
+    多进程并行探索，共享一个已发现图模型和 frontier。
+
+    主进程是协调者：持有模型和 frontier ({state: [未尝试动作]})，把 (path, state, action)
+    任务分给空闲 worker，优先分配 worker 当前所在状态的任务 (省掉 reset+回放)，
+    否则取最近发现的状态 (类 DFS)。worker 发布的边汇总到传入的 env 上，
+    因此 env (EnvMonitor) 的 step_counter / reset_counter / replay_counter / explored_edges 是所有 worker 的合并视图
+    (带 CostModel 时同样按这些计数记账)。
+
+    env 只用作模板和汇总视图：worker 用 env_factory(env.unwrapped)(max_depth=...) 创建自己的实例。
+    step_delay 模拟真机每步耗时 (秒)，回放同样计时。
+    worker 意外退出时，它手上的任务退回 frontier 由其余 worker 继续；全部退出则提前结束。
+    返回 env.get_stats() 加上 workers / wall_time / coverage_per_sec / dead_workers / model (不打印，由评测报告汇总)。
+    """
+    raw = env.unwrapped
+    profiler = getattr(env, 'profiler', None)
+    make_env = env_factory(raw)
+    max_depth = getattr(raw, 'max_depth', 10)
+    num_actions = env.action_space.n
+    action_mask = getattr(raw, 'action_mask', None)
+
+    ctx = mp.get_context()
+    result_q = ctx.Queue()
+    task_qs = [ctx.Queue() for _ in range(num_workers)]
+    workers = [ctx.Process(target=_worker_main, daemon=True,
+                           args=(w, make_env, max_depth, task_qs[w], result_q, step_delay))
+               for w in range(num_workers)]
+
+    model = {}      # {state: {action: next_state}}
+    paths = {}      # {state: 从 reset 起点到该状态的动作序列}
+    pending = {}    # frontier: {state: [未尝试的动作]}
+    order = []      # 有未尝试动作的状态，后发现的先展开
+    retries = {}
+    position = {}   # worker 最近的物理位置
+    idle = set()
+    busy = {}      # {worker: 正在执行的任务}
+    dead = set()
+    steps = 0
+    success = False
+
+    def add_state(state, path):
+        if state in paths:
+            return False
+        paths[state] = path
+        # 有 action_mask 的 env (文件图) 只派发有效动作，空操作不占 worker
+        actions = np.nonzero(action_mask(state))[0].tolist() if action_mask else range(num_actions)
+        pending[state] = list(reversed(actions))
+        if not pending[state]:
+            del pending[state]
+        order.append(state)
+        return True
+
+    def next_task(worker_id):
+        state = position.get(worker_id)
+        if state not in pending:
+            state = None
+            while order:
+                cand = order[-1]
+                if cand in pending:
+                    state = cand
+                    break
+                order.pop()
+        if state is None:
+            return None
+        action = pending[state].pop()
+        if not pending[state]:
+            del pending[state]
+        return (paths[state], state, action)
+
+    start_time = time.time()
+    for p in workers:
+        p.start()
+
+    # 只为第一帧取起点，走 unwrapped 不计入 reset 次数 / 成本
+    if animator: animator.capture_frame(raw.reset()[0], 0, 0)
+
+    def requeue(state, action):
+        pending.setdefault(state, []).append(action)
+        order.append(state)
+
+    def ready(w):
+        # 已判定退出的 worker 可能还有在途消息，不再给它派任务
+        if w not in dead:
+            idle.add(w)
+
+    def reap_dead():
+        """退出的 worker 从 idle / busy 里移除，手上的任务退回 frontier"""
+        for w, p in enumerate(workers):
+            if w in dead or p.is_alive():
+                continue
+            dead.add(w)
+            idle.discard(w)
+            task = busy.pop(w, None)
+            if task is not None:
+                requeue(task[1], task[2])
+
+    try:
+        while len(dead) < num_workers:
+            # 分配任务：预算按已发出的任务数预留，避免超支
+            for w in sorted(idle):
+                if steps + len(busy) >= total_budget or success:
+                    break
+                task = next_task(w)
+                if task is None:
+                    break
+                idle.discard(w)
+                busy[w] = task
+                task_qs[w].put(task)
+
+            if not busy and (success or steps >= total_budget or not pending) and \
+                    len(idle) == num_workers - len(dead):
+                break
+
+            try:
+                msg = result_q.get(timeout=1)
+            except queue.Empty:
+                reap_dead()
+                continue
+
+            kind, w = msg[0], msg[1]
+            if kind == "start":
+                # 每个 reset 落点都是一个根 (多入口 env 会有多个)
+                add_state(msg[2], [])
+                merge_worker_counts(env, resets=1)
+                position[w] = msg[2]
+                # 启动时的 reset：worker 就绪；任务中途的 reset 只登记入口
+                if w not in busy:
+                    ready(w)
+            elif kind == "lost":
+                busy.pop(w, None)
+                _, _, task, current, replayed = msg
+                merge_worker_counts(env, replays=replayed)
+                path, state, action = task
+                position[w] = current
+                key = (state, action)
+                retries[key] = retries.get(key, 0) + 1
+                if retries[key] < (MAX_ROOT_RETRIES if not path else MAX_TASK_RETRIES):
+                    requeue(state, action)
+                ready(w)
+            elif kind == "edge":
+                busy.pop(w, None)
+                _, _, state, action, next_state, reward, terminated, worker_success, replayed = msg
+                steps += 1
+                model.setdefault(state, {})[action] = next_state
+                add_state(next_state, paths[state] + [action])
+                position[w] = next_state
+                ready(w)
+
+                # 合并视图：汇总到传入的 env 上
+                n_before = len(raw.explored_edges)
+                raw.explored_edges.add((state, action))
+                merge_worker_counts(env, steps=1, replays=replayed)
+                if profiler is not None:
+                    # 两个 worker 探索到同一条边时，后到的算重复
+                    profiler.on_step(len(raw.explored_edges) > n_before, False)
+                if worker_success:
+                    success = True
+                    raw.success = True
+                if animator: animator.capture_frame(next_state, env.step_counter, reward)
+    finally:
+        for q in task_qs:
+            q.put(None)
+        for p in workers:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+
+    wall_time = time.time() - start_time
+    stats = env.get_stats() if hasattr(env, 'get_stats') else {"steps": steps}
+    coverage = stats.get("coverage_percent", 0.0)
+    stats.update({
+        "workers": num_workers,
+        "wall_time": wall_time,
+        "coverage_per_sec": coverage / wall_time if wall_time > 0 else 0.0,
+        "dead_workers": len(dead),
+        "model": model,
+    })
+    return stats
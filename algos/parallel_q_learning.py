@@ -0,0 +1,170 @@
+import multiprocessing as mp
+import queue
+import random
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from algos.parallel_dfs import env_factory, merge_worker_counts
+from algos.q_learning import QLearningAgent, QLambdaAgent
+
+# worker 每走这么多步 (或 episode 结束) 向协调者汇报一次
+SYNC_EVERY = 50
+
+def _worker_main(worker_id, seed, make_env, max_depth, shm_name, shape, lam,
+                 step_counter, total_budget, stop, result_q, step_delay):
+    """
+    Worker 进程：自己的 env 和 agent，Q 表是共享内存上的视图，TD 更新不加锁 (Hogwild)。
+    预算用共享计数器领取，保证所有 worker 合计不超支。
+    """
+    random.seed(seed)
+    np.random.seed(seed % (2 ** 32))
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        env = make_env(max_depth=max_depth)
+        if lam is None:
+            agent = QLearningAgent(*shape)
+        else:
+            agent = QLambdaAgent(*shape, lam=lam)
+        agent.q_table = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+        steps, resets, new_edges = 0, 0, []
+        last_state, last_reward = None, 0.0
+        def flush(success=False):
+            nonlocal steps, resets, new_edges
+            result_q.put(("batch", worker_id, steps, resets, new_edges, last_state, last_reward, success))
+            steps, resets, new_edges = 0, 0, []
+
+        while not stop.is_set():
+            state, _ = env.reset()
+            resets += 1
+            done = False
+            while not done:
+                # 领取一步预算
+                with step_counter.get_lock():
+                    if step_counter.value >= total_budget or stop.is_set():
+                        flush()
+                        return
+                    step_counter.value += 1
+
+                action = agent.choose_action(state)
+                if step_delay: time.sleep(step_delay)
+                n_before = len(env.explored_edges)
+                next_state, reward, terminated, truncated, _ = env.step(action)
+                if len(env.explored_edges) > n_before:
+                    new_edges.append((state, int(action)))
+                agent.update(state, action, reward, next_state)
+                state = next_state
+                steps += 1
+                last_state, last_reward = next_state, reward
+                done = terminated or truncated
+
+                if terminated:
+                    # 任务完成：通知所有 worker 停下
+                    stop.set()
+                    flush(success=bool(getattr(env, 'success', False)))
+                    return
+                if steps >= SYNC_EVERY:
+                    flush()
+            agent.end_episode()
+            flush()
+    finally:
+        result_q.put(("done", worker_id))
+        shm.close()
+
+def run_parallel_q_learning_session(env, animator=None, total_budget=100, num_workers=4, step_delay=0.0,
+                                    lam=None, **kwargs):
+    """
+    Hogwild 式并行 Q-Learning：Q 表放在 multiprocessing.shared_memory 里，
+    num_workers 个进程各自持有 env 实例，异步、无锁地往同一张表上做 TD 更新。
+
+    worker 按批汇报 (步数 / reset 数 / 新边)，汇总到传入的 env 上，
+    因此 env (EnvMonitor) 的 step_counter / reset_counter / explored_edges 是所有 worker 的合并视图
+    (带 CostModel 时按这些计数记账)；
+    合并后的覆盖率达到 100% 时也会通知 worker 停下。
+    env 只用作模板和汇总视图：worker 用 env_factory(env.unwrapped)(max_depth=...) 创建自己的实例。
+    lam: 不为 None 时每个 worker 用 Watkins Q(λ)。step_delay 模拟真机每步耗时 (秒)。
+    worker 意外退出 (没发 "done") 时按 1 秒一次的存活检查发现，其余 worker 继续。
+    返回 env.get_stats() 加上 workers / wall_time / coverage_per_sec / dead_workers / q_table (不打印，由评测报告汇总)。
+    """
+    raw = env.unwrapped
+    profiler = getattr(env, 'profiler', None)
+    make_env = env_factory(raw)
+    max_depth = getattr(raw, 'max_depth', 10)
+    shape = (env.observation_space.n, env.action_space.n)
+    max_edges = env.get_max_edges() if hasattr(env, 'get_max_edges') else 0
+
+    ctx = mp.get_context()
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+    q_table = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    q_table[:] = 0.0
+
+    step_counter = ctx.Value('q', 0)
+    stop = ctx.Event()
+    result_q = ctx.Queue()
+    # 每个 worker 的随机种子从主进程的随机数里取，整体仍然可复现
+    seeds = [random.randrange(2 ** 31) for _ in range(num_workers)]
+    workers = [ctx.Process(target=_worker_main, daemon=True,
+                           args=(w, seeds[w], make_env, max_depth, shm.name, shape, lam,
+                                 step_counter, total_budget, stop, result_q, step_delay))
+               for w in range(num_workers)]
+
+    start_time = time.time()
+    for p in workers:
+        p.start()
+
+    # 只为第一帧取起点，走 unwrapped 不计入 reset 次数 / 成本
+    if animator: animator.capture_frame(raw.reset()[0], 0, 0)
+
+    finished = set() # 发过 "done" 的 worker
+    dead = set()     # 没发 "done" 就退出的 worker (被 kill / 段错误)，它没汇报的步数丢失
+    try:
+        while len(finished) + len(dead) < num_workers:
+            try:
+                msg = result_q.get(timeout=1)
+            except queue.Empty:
+                dead.update(w for w, p in enumerate(workers) if w not in finished and not p.is_alive())
+                continue
+
+            if msg[0] == "done":
+                finished.add(msg[1])
+                dead.discard(msg[1])
+                continue
+
+            _, w, steps, resets, new_edges, last_state, last_reward, success = msg
+            # 合并视图：汇总到传入的 env 上
+            n_before = len(raw.explored_edges)
+            raw.explored_edges.update(new_edges)
+            if profiler is not None:
+                # 两个 worker 各自发现的同一条边，后合并的算重复
+                merged = len(raw.explored_edges) - n_before
+                profiler.on_steps(merged, steps - merged)
+            merge_worker_counts(env, steps=steps, resets=resets)
+            if success:
+                raw.success = True
+            if max_edges and len(raw.explored_edges) >= max_edges:
+                stop.set()
+            if animator and steps: animator.capture_frame(last_state, env.step_counter, last_reward)
+    finally:
+        stop.set()
+        for p in workers:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        final_q = q_table.copy()
+        del q_table
+        shm.close()
+        shm.unlink()
+
+    wall_time = time.time() - start_time
+    stats = env.get_stats() if hasattr(env, 'get_stats') else {"steps": env.step_counter}
+    coverage = stats.get("coverage_percent", 0.0)
+    stats.update({
+        "workers": num_workers,
+        "wall_time": wall_time,
+        "coverage_per_sec": coverage / wall_time if wall_time > 0 else 0.0,
+        "dead_workers": len(dead),
+        "q_table": final_q,
+    })
+    return stats
@@ -1,5 +1,9 @@
 import numpy as np
 import random
+from algos.action_pruning import ActionPruner
+from algos.model_cache import TransitionModel, load_model_if_exists
+from utils.checkpoint import SessionCheckpointer
+from utils.step_profiler import phase_timer
 
 class QLearningAgent:
     def __init__(self, state_dim, action_dim):
@@ -7,9 +11,18 @@ class QLearningAgent:
         self.lr = 0.1
         self.gamma = 0.9
         self.epsilon = 0.3
+        # 观测到的转移 {state: {action: next_state}}，只在需要导出时维护
+        self.model = None
+        # 动作剪枝 (ActionPruner，可选)：随机探索时避开冗余动作
+        self.pruner = None
+        # checkpoint 增量日志：改动过的 Q 值 / 新转移
+        self._dirty = None
+        self._model_log = None
 
     def choose_action(self, state):
         if random.random() < self.epsilon:
+            if self.pruner is not None:
+                return random.choice(self.pruner.explore_candidates(state))
             return random.randint(0, self.q_table.shape[1] - 1)
         return np.argmax(self.q_table[state])
 
@@ -17,32 +30,204 @@ class QLearningAgent:
         old = self.q_table[state, action]
         nxt = np.max(self.q_table[next_state])
         self.q_table[state, action] = old + self.lr * (reward + self.gamma * nxt - old)
+        if self._dirty is not None:
+            self._dirty.add((state, int(action)))
 
-def run_q_learning_session(env, animator=None, total_budget=100, **kwargs):
-    agent = QLearningAgent(env.observation_space.n, env.action_space.n)
+    def end_episode(self):
+        pass
+
+    def record(self, state, action, next_state):
+        if self.pruner is not None:
+            self.pruner.observe(state, action, next_state)
+        if self.model is None:
+            return
+        self.model.setdefault(state, {})[int(action)] = next_state
+        if self._model_log is not None:
+            self._model_log.append([state, int(action), next_state])
+
+    # === checkpoint (见 utils/checkpoint.py) ===
+    def enable_journal(self, seed=True):
+        """seed=True 时把 Q 表的非零项 (例如热启动的初值) 写进第一条增量"""
+        self._dirty = set()
+        self._model_log = []
+        if self.pruner is not None:
+            self.pruner.enable_journal()
+        if seed:
+            rows, cols = np.nonzero(self.q_table)
+            self._dirty.update(zip(rows.tolist(), cols.tolist()))
+            for s, edges in (self.model or {}).items():
+                self._model_log.extend([s, a, nxt] for a, nxt in edges.items())
+
+    def checkpoint_state(self):
+        delta = {"q": [[s, a, float(self.q_table[s, a])] for s, a in self._dirty],
+                 "model": self._model_log}
+        self._dirty, self._model_log = set(), []
+        snapshot = {}
+        if self.pruner is not None:
+            delta["prune"], snapshot["prune"] = self.pruner.checkpoint_state()
+        return delta, snapshot
+
+    def restore_checkpoint(self, state):
+        for s, a, value in state["delta"].get("q", []):
+            self.q_table[s, a] = value
+        pruner, self.pruner = self.pruner, None
+        for s, a, nxt in state["delta"].get("model", []):
+            self.record(s, a, nxt)
+        self.pruner = pruner
+        if pruner is not None and "prune" in state["snapshot"]:
+            pruner.restore_checkpoint(state["delta"].get("prune", []), state["snapshot"]["prune"])
+
+class QLambdaAgent(QLearningAgent):
+    """
+    Watkins Q(λ)：在 QLearningAgent 上加资格迹，一次奖励沿本 episode 走过的 (s, a) 一起回传。
+
+    - 迹是稀疏的：只存本 episode 访问过的 (s, a)，三个并排数组 (状态 / 动作 / 迹值)
+    - 每步对所有迹做一次向量化更新：Q[s, a] += lr * δ * e，随后 e *= γλ，低于 trace_cutoff 的丢掉
+    - 替换迹 (重复访问把 e 置 1，不累加)，避免 UTG 里的自环把迹放大
+    - 下一步选了探索动作 (不是贪心动作) 时清空迹：之后的回报不再代表贪心策略
+    下一步动作在 update 里就选好 (需要知道它是不是贪心的)，choose_action 直接返回它。
+    """
+    def __init__(self, state_dim, action_dim, lam=0.9, trace_cutoff=1e-3):
+        super().__init__(state_dim, action_dim)
+        self.lam = lam
+        self.trace_cutoff = trace_cutoff
+        self.trace_s = np.empty(0, dtype=np.int64)
+        self.trace_a = np.empty(0, dtype=np.int64)
+        self.trace_e = np.empty(0)
+        self._next = None # (state, action)：update 里预先选好的下一步动作
+
+    def choose_action(self, state):
+        if self._next is not None and self._next[0] == state:
+            action = self._next[1]
+            self._next = None
+            return action
+        return super().choose_action(state)
+
+    def update(self, state, action, reward, next_state):
+        next_action = super().choose_action(next_state)
+        best = int(np.argmax(self.q_table[next_state]))
+        self._next = (next_state, next_action)
+
+        delta = reward + self.gamma * self.q_table[next_state, best] - self.q_table[state, action]
+
+        # 替换迹：(s, a) 已在迹里就把 e 置 1，否则追加
+        hit = np.flatnonzero((self.trace_s == state) & (self.trace_a == action))
+        if len(hit):
+            self.trace_e[hit[0]] = 1.0
+        else:
+            self.trace_s = np.append(self.trace_s, state)
+            self.trace_a = np.append(self.trace_a, int(action))
+            self.trace_e = np.append(self.trace_e, 1.0)
+
+        # 一次向量化更新所有迹 (同一 (s, a) 只出现一次，不会有重复下标)
+        self.q_table[self.trace_s, self.trace_a] += self.lr * delta * self.trace_e
+        if self._dirty is not None:
+            self._dirty.update(zip(self.trace_s.tolist(), self.trace_a.tolist()))
+
+        if next_action == best:
+            self.trace_e *= self.gamma * self.lam
+            keep = self.trace_e >= self.trace_cutoff
+            if not keep.all():
+                self.trace_s, self.trace_a, self.trace_e = self.trace_s[keep], self.trace_a[keep], self.trace_e[keep]
+        else:
+            self.clear_traces()
+
+    def clear_traces(self):
+        self.trace_s = self.trace_s[:0]
+        self.trace_a = self.trace_a[:0]
+        self.trace_e = self.trace_e[:0]
+
+    def end_episode(self):
+        self.clear_traces()
+        self._next = None
+
+def run_q_learning_session(env, animator=None, total_budget=100, model_path=None, save_model_path=None,
+                           checkpoint_path=None, checkpoint_every=1000, prune=False,
+                           lam=None, trace_cutoff=1e-3, **kwargs):
+    """
+    model_path: 用之前导出的转移模型初始化 Q 表 (见 TransitionModel.warm_start_q_table)。
+    save_model_path: session 结束后把观测到的转移导出 (.npz)。
+    checkpoint_path: 每 checkpoint_every 步 (在 episode 之间) 追加一条 checkpoint；
+        文件已存在时从最后一条继续。env 需要是 EnvMonitor。
+    prune: True 或 ActionPruner 实例时开启动作剪枝，随机探索只在非冗余动作里选 (冗余动作偶尔探测)。
+    lam: 不为 None 时使用 Watkins Q(λ) (QLambdaAgent)，trace_cutoff 为迹值的截断阈值。
+    """
+    if lam is None:
+        agent = QLearningAgent(env.observation_space.n, env.action_space.n)
+    else:
+        agent = QLambdaAgent(env.observation_space.n, env.action_space.n, lam=lam, trace_cutoff=trace_cutoff)
+    prior = load_model_if_exists(model_path)
+    if prior is not None:
+        prior.warm_start_q_table(agent.q_table, gamma=agent.gamma)
+    
+    if save_model_path:
+        agent.model = {}
+    if prune:
+        agent.pruner = prune if isinstance(prune, ActionPruner) else ActionPruner(env.action_space.n)
+    checkpointer = SessionCheckpointer(checkpoint_path, checkpoint_every) if checkpoint_path else None
+    phase = phase_timer(env)
+    _q_learning_loop(env, agent, animator, total_budget, checkpointer)
     
-    while env.step_counter < total_budget:
+    if save_model_path:
+        phase("save_model")
+        model = agent.model
+        if prior is not None:
+            for s in prior.states.tolist():
+                for a, nxt in prior.successors(s):
+                    model.setdefault(s, {}).setdefault(a, nxt)
+        TransitionModel.from_dict(model, (), env.action_space.n).save(save_model_path)
+    phase(None)
+    return agent
+
+def _q_learning_loop(env, agent, animator, total_budget, checkpointer=None):
+    # 阶段耗时 (env 带 StepProfiler 时)：start / checkpoint / reset / choose / step / update / render
+    phase = phase_timer(env)
+    phase("start")
+    if checkpointer is not None:
+        resumed = checkpointer.load()
+        if resumed is not None:
+            # 从 checkpoint 恢复：Q 表、env、计数器、随机数状态
+            checkpointer.restore_env(env, resumed)
+            agent.restore_checkpoint(resumed)
+        else:
+            checkpointer.attach(env)
+        agent.enable_journal(seed=resumed is None)
+    
+    while env.budget_used < total_budget:
+        # 只在 episode 之间写 checkpoint，恢复后从下一个 episode 开始
+        if checkpointer is not None and checkpointer.due(env):
+            phase("checkpoint")
+            checkpointer.save(env, agent)
+        
+        phase("reset")
         state, _ = env.reset()
         
         if animator and env.step_counter == 0: 
+            phase("render")
             animator.capture_frame(state, 0, 0)
         
         done = False
-        while not done and env.step_counter < total_budget:
+        while not done and env.budget_used < total_budget:
+            phase("choose")
             action = agent.choose_action(state)
             
             # [修改] 接收 truncated
+            phase("step")
             next_state, reward, terminated, truncated, _ = env.step(action)
             
             # 只要是 terminated 或 truncated，当前 Episode 就结束
             done = terminated or truncated
             
             if animator: 
+                phase("render")
                 animator.capture_frame(next_state, env.step_counter, reward)
             
+            phase("update")
             agent.update(state, action, reward, next_state)
+            agent.record(state, action, next_state)
             state = next_state
             
             if terminated: # 任务真正完成
                 return
+        agent.end_episode()
     return
\ No newline at end of file
@@ -91,12 +91,21 @@ class ComplexDateEnv(gym.Env):
         
         return self.current_month, reward, terminated, truncated, {}
 
+    def set_state(self, state, episode_step=0):
+        """直接跳到某个月份 (用于回放加速，不记录边)"""
+        self.current_month = state
+        self.current_episode_step = episode_step
+        self.success = False
+
     def get_max_edges(self):
         # 这是一个极大的搜索空间
         # 即使只算通向目标的路径，也很难量化
         # 这里给个定值作为分母
         return 100000
 
+    def node_name(self, state):
+        return f"Month {state}"
+
     @property
     def node_names(self):
         # 动态生成名字用于画图
@@ -104,7 +113,7 @@ class ComplexDateEnv(gym.Env):
         # 记录所有访问过的月份
         visited_months = set([s for s, a in self.explored_edges] + [self.current_month])
         for m in visited_months:
-            names[m] = f"Month {m}"
+            names[m] = self.node_name(m)
         return names
 
     def get_ground_truth_graph(self):
@@ -2,8 +2,12 @@ from envs.toy_env import ToyUTGEnv
 from envs.hard_env import HardUTGEnv
 from envs.complex_env import ComplexDateEnv
 from envs.multistart_env import MultiStartEnv
+from envs.file_env import make_file_env_class
 
 def get_env_class(env_name):
+    # "file:<path>": 外部抓取的边表 (.csv / .jsonl / .npz)，路径区分大小写
+    if env_name.strip().lower().startswith('file:'):
+        return make_file_env_class(env_name.strip()[len('file:'):])
     name = env_name.lower().strip()
     if name == 'toy': return ToyUTGEnv
     elif name == 'hard': return HardUTGEnv
@@ -0,0 +1,235 @@
+import json
+import os
+from functools import partial
+
+import gymnasium as gym
+from gymnasium import spaces
+import numpy as np
+
+from utils.array_store import save_arrays, load_arrays
+
+# 进程内缓存：同一个文件的多次 run 共享只读数组
+_GRAPH_CACHE = {}
+
+# 超过这个边数时 get_ground_truth_graph 只返回已探索部分 (同 Hard/Complex)
+FULL_GRAPH_EDGE_LIMIT = 10000
+
+# 解析时每次读入的字节数：只有一个块的 Python 字符串同时存在，大文件的峰值内存有界
+PARSE_CHUNK_BYTES = 1 << 24
+
+def _line_chunks(path):
+    """按行边界切块读取 (bytes)，每块约 PARSE_CHUNK_BYTES"""
+    with open(path, "rb") as f:
+        while True:
+            lines = f.readlines(PARSE_CHUNK_BYTES)
+            if not lines:
+                break
+            yield b"".join(lines).replace(b"\r", b"").strip()
+
+def _concat_columns(chunks):
+    if not chunks:
+        empty = np.array([], dtype="S1")
+        return empty, empty, empty
+    return tuple(np.concatenate([c[i] for c in chunks]) for i in range(3))
+
+def _parse_csv(path):
+    """src,action,dst 三列 (可带表头)，按块整体 split 成 bytes 数组后 reshape，不逐行解析"""
+    chunks = []
+    for buf in _line_chunks(path):
+        if not chunks:
+            first, _, rest = buf.partition(b"\n")
+            if first.replace(b" ", b"").lower().startswith(b"src,"):
+                buf = rest.strip()
+        if not buf:
+            continue
+        tokens = np.char.strip(np.array(buf.replace(b"\n", b",").split(b","))).reshape(-1, 3)
+        chunks.append((tokens[:, 0], tokens[:, 1], tokens[:, 2]))
+    return _concat_columns(chunks)
+
+def _parse_jsonl(path):
+    """每行 {"src": ..., "action": ..., "dst": ...}；每块拼成一个 JSON 数组，一次 json.loads"""
+    chunks = []
+    for buf in _line_chunks(path):
+        lines = [line for line in buf.split(b"\n") if line.strip()]
+        if not lines:
+            continue
+        edges = json.loads(b"[" + b",".join(lines) + b"]")
+        chunks.append(tuple(np.array([str(e[k]) for e in edges]) for k in ("src", "action", "dst")))
+    return _concat_columns(chunks)
+
+def _parse_npz(path):
+    """src / dst (必需)，action (可选)；数组可以是整数或字符串"""
+    data = load_arrays(path, mmap=False)
+    src, dst = data["src"].astype(str), data["dst"].astype(str)
+    act = data["action"].astype(str) if "action" in data else np.arange(len(src)).astype(str)
+    return src, act, dst
+
+def build_csr(src, act, dst):
+    """
+    字符串边表 -> CSR。状态按名字排序编号；每个状态的出边按动作名排序，
+    第 k 条出边就是动作 k。重复的 (src, action) 只保留第一条。
+    """
+    names, inv = np.unique(np.concatenate([src, dst]), return_inverse=True)
+    s, d = inv[:len(src)], inv[len(src):]
+
+    order = np.lexsort((act, s))
+    s, a, d = s[order], act[order], d[order]
+    keep = np.ones(len(s), dtype=bool)
+    keep[1:] = (s[1:] != s[:-1]) | (a[1:] != a[:-1])
+    s, d = s[keep], d[keep]
+
+    indptr = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(s, minlength=len(names)), out=indptr[1:])
+    return indptr, d.astype(np.int32), names
+
+def load_graph(path, start=None):
+    """
+    读取边表 (.csv / .jsonl / .npz)。解析结果缓存为同目录下的 <path>.graph.npz，
+    源文件没变时直接 memmap 缓存，不再解析。
+    """
+    path = os.path.abspath(path)
+    if path not in _GRAPH_CACHE:
+        _GRAPH_CACHE[path] = _load_graph_file(path)
+    graph = _GRAPH_CACHE[path]
+    if start is not None:
+        names, name = graph["names"], str(start)
+        idx = int(np.searchsorted(names, name))
+        if idx >= len(names) or names[idx] != name:
+            raise ValueError(f"Unknown start state {start!r} in {path}")
+        graph = dict(graph, start=np.array(idx))
+    return graph
+
+def _load_graph_file(path):
+    cache_path = path + ".graph.npz"
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        graph = load_arrays(cache_path, mmap=True)
+    else:
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".csv":
+            src, act, dst = _parse_csv(path)
+        elif ext == ".jsonl":
+            src, act, dst = _parse_jsonl(path)
+        elif ext == ".npz":
+            src, act, dst = _parse_npz(path)
+        else:
+            raise ValueError(f"Unsupported graph file: {path}")
+        indptr, next_states, names = build_csr(src, act, dst)
+        # 默认起点：文件里第一条边的 src
+        start_id = int(np.searchsorted(names, src[0])) if len(src) else 0
+        if names.dtype.kind == "S":
+            # CSV 按 bytes 解析；UTF-8 的字节序和码点序一致，解码后仍然有序
+            names = np.char.decode(names, "utf-8")
+        graph = {"indptr": indptr, "next_states": next_states, "names": names,
+                 "start": np.array(start_id)}
+        save_arrays(cache_path, **graph)
+    return graph
+
+class FileGraphEnv(gym.Env):
+    """
+    从外部抓取的 UTG 边表加载的环境。
+
+    状态 s 的第 k 条出边 = 动作 k，动作空间大小为最大出度；k >= 出度的动作是原地不动的空操作，
+    不是图里的边：不记入 explored_edges，奖励同重复边，get_max_edges() 只数文件里的真实边。
+    action_mask(s) 给出状态 s 的有效动作。奖励和终止规则同 ToyUTGEnv。
+    """
+    default_path = None
+
+    def __init__(self, max_depth=20, path=None, start=None):
+        super().__init__()
+        self.path = path or self.default_path
+        self.start = start
+        graph = load_graph(self.path, start)
+        self.indptr = graph["indptr"]
+        self.next_states = graph["next_states"]
+        self.names = graph["names"]
+        self.start_state = int(graph["start"])
+
+        self.num_states = len(self.names)
+        degree = np.diff(self.indptr)
+        self.num_actions = max(int(degree.max()) if len(degree) else 1, 1)
+        self.action_space = spaces.Discrete(self.num_actions)
+        self.observation_space = spaces.Discrete(self.num_states)
+
+        self.max_depth = max_depth
+        self.current_episode_step = 0
+        self.explored_edges = set()
+        self.state = self.start_state
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        self.state = self.start_state
+        self.current_episode_step = 0
+        return self.state, {}
+
+    def _next(self, state, action):
+        lo, hi = self.indptr[state], self.indptr[state + 1]
+        return int(self.next_states[lo + action]) if action < hi - lo else state
+
+    def step(self, action):
+        self.current_episode_step += 1
+        prev_state = self.state
+        self.state = self._next(prev_state, int(action))
+
+        edge_key = (prev_state, action)
+        if action < self.indptr[prev_state + 1] - self.indptr[prev_state] and edge_key not in self.explored_edges:
+            self.explored_edges.add(edge_key)
+            reward = 1.0
+        else:
+            reward = -0.1
+
+        total_edges = self.get_max_edges()
+        terminated = len(self.explored_edges) >= total_edges
+        if terminated:
+            reward += 100
+        truncated = self.current_episode_step >= self.max_depth
+
+        info = {"coverage": len(self.explored_edges) / max(total_edges, 1)}
+        return self.state, reward, terminated, truncated, info
+
+    def set_state(self, state, episode_step=0):
+        """直接跳到某个状态 (用于回放加速，不记录边)"""
+        self.state = state
+        self.current_episode_step = episode_step
+
+    def get_start_states(self):
+        return [self.start_state]
+
+    def get_max_edges(self):
+        return int(self.indptr[-1])
+
+    def worker_factory(self):
+        """并行 runner 的 worker 用的构造器：make_file_env_class 动态生成的子类不能 pickle，只传路径"""
+        return partial(FileGraphEnv, path=self.path, start=self.start)
+
+    def action_mask(self, state):
+        """状态 state 上的有效动作 (bool 数组)，其余动作是空操作"""
+        return np.arange(self.num_actions) < self.indptr[state + 1] - self.indptr[state]
+
+    def node_name(self, state):
+        return str(self.names[state])
+
+    @property
+    def node_names(self):
+        # 只给已经见过的状态起名，大图也不会一次性展开
+        seen = set(s for s, _ in self.explored_edges)
+        seen.add(self.state)
+        return {s: self.node_name(s) for s in seen}
+
+    def get_ground_truth_graph(self):
+        if self.get_max_edges() <= FULL_GRAPH_EDGE_LIMIT:
+            return {s: {a: int(self.next_states[self.indptr[s] + a])
+                        for a in range(int(self.indptr[s + 1] - self.indptr[s]))}
+                    for s in range(self.num_states)}
+        # 大图只返回已探索的部分
+        graph = {}
+        for s, a in self.explored_edges:
+            graph.setdefault(s, {})[a] = self._next(s, int(a))
+        return graph
+
+    def get_explored_edges(self):
+        return self.explored_edges
+
+def make_file_env_class(path):
+    """把文件路径绑定到一个 FileGraphEnv 子类上，保持 env_class(max_depth=...) 的调用方式"""
+    name = "FileGraphEnv_" + os.path.splitext(os.path.basename(path))[0]
+    return type(name, (FileGraphEnv,), {"default_path": os.path.abspath(path)})
@@ -56,17 +56,26 @@ class HardUTGEnv(gym.Env):
             
         return self.state, reward, terminated, truncated, {}
 
+    def set_state(self, state, episode_step=0):
+        """直接跳到某个状态 (用于回放加速，不记录边)"""
+        self.state = state
+        self.current_episode_step = episode_step
+        self.success = state == 999
+
     def get_max_edges(self):
         # [修改] 返回一个较大的数，代表"完全探索陷阱"所需的代价
         # 这样 DFS 跑了 15 步也就只有 15/50 = 30% 的进度
         return 50 
 
+    def node_name(self, state):
+        return {0: "Home", 999: "Success"}.get(state, f"Month_{state}")
+
     @property
     def node_names(self):
         names = {0: "Home", 999: "Success"}
         for s, _ in self.explored_edges:
-            if s not in names: names[s] = f"Month_{s}"
-        if self.state not in names: names[self.state] = f"Month_{self.state}"
+            if s not in names: names[s] = self.node_name(s)
+        if self.state not in names: names[self.state] = self.node_name(self.state)
         return names
 
     def get_ground_truth_graph(self):
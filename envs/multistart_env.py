@@ -90,6 +90,11 @@ class MultiStartEnv(gym.Env):
             
         return self.state, reward, terminated, truncated, info
 
+    def set_state(self, state, episode_step=0):
+        """直接跳到某个状态 (用于回放加速，不记录边)"""
+        self.state = state
+        self.current_episode_step = episode_step
+
     def get_max_edges(self):
         # Entrances: 3个节点 * 2动作 = 6条边
         # Hub: 1个节点 * 2动作 = 2条边
@@ -97,6 +102,10 @@ class MultiStartEnv(gym.Env):
         # 总计: 12 条边
         return 12
 
+    def get_start_states(self):
+        # reset 随机落到的入口集合
+        return [0, 1, 2]
+
     @property
     def node_names(self):
         return {
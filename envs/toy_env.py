@@ -61,6 +61,11 @@ class ToyUTGEnv(gym.Env):
             
         return self.state, reward, terminated, truncated, info
 
+    def set_state(self, state, episode_step=0):
+        """直接跳到某个状态 (用于回放加速，不记录边)"""
+        self.state = state
+        self.current_episode_step = episode_step
+
     def get_max_edges(self):
         count = 0
         for src, acts in self.transitions.items():
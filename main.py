@@ -1,33 +1,69 @@
 import os
 import sys
 import torch
+from functools import partial
 from datetime import datetime
 from utils.evaluator import evaluate_algorithms
 from utils.config import ARGConfig
 from utils.default_config import default_config
-from algos import dfs,q_learning
+from utils.metrics import MetricsExporter
+from algos import dfs,q_learning,parallel_dfs,parallel_q_learning
 from envs.factory import get_env_class
 
 def main():
     arg = ARGConfig()
-    arg.add_arg("env_name", "multistart", "Environment name")
+    arg.add_arg("env_name", "multistart", "Environment name (toy/hard/complex/multistart or file:<edges.csv|jsonl|npz>)")
     arg.add_arg("num_steps", 100, "Maximum Number of Steps")
     arg.add_arg("truncated", 10, "Truncated Length")
     arg.add_arg("runs", 1, "Evaluation Times")
+    arg.add_arg("adaptive", False, "Adaptive run count with sequential stopping (ignores runs)")
+    arg.add_arg("max_runs", 1000, "Hard maximum runs per algorithm in adaptive mode")
+    arg.add_arg("dfs_backend", "dict", "DFS agent backend: dict / compact")
+    arg.add_arg("workers", 0, "Worker processes for Parallel-DFS (0 = disabled)")
+    arg.add_arg("q_workers", 0, "Worker processes for Hogwild Parallel-Q-Learning (0 = disabled)")
+    arg.add_arg("metrics_port", 0, "Serve live metrics on http://127.0.0.1:<port>/metrics (0 = disabled)")
+    arg.add_arg("progress", True, "Print live throughput / ETA lines")
+    arg.add_arg("memoize", False, "Cache known transitions and fast-forward DFS replays")
+    arg.add_arg("q_lambda", 0.0, "Lambda for an extra Watkins Q(lambda) competitor (0 = disabled)")
+    arg.add_arg("costs", "", "Cost model 'step,reset,replay' in cost units, e.g. 1,5,0.2 (empty = disabled)")
+    arg.add_arg("latency", "", "Simulated device latency 'step,reset,replay' in seconds (virtual unless real_sleep)")
+    arg.add_arg("real_sleep", False, "Inject the simulated latency as real sleeps")
+    arg.add_arg("cost_budget", False, "Enforce num_steps in cost units instead of counted steps")
+    arg.add_arg("prune", False, "Learn no-op / equivalent actions and deprioritise them (DFS and Q-Learning)")
     arg.parser()
 
     config = default_config  
     config.update(arg)
 
-    result_path = os.path.join("results", "{}_t{}_n{}_{}".format(config.env_name, 
+    # file:<path> 只取文件名作为结果目录名
+    env_tag = os.path.splitext(os.path.basename(config.env_name))[0] if ":" in config.env_name else config.env_name
+    result_path = os.path.join("results", "{}_t{}_n{}_{}".format(env_tag, 
                                                             config.truncated, config.num_steps, 
                                                             datetime.now().strftime("%Y-%m-%d_%H-%M-%S")))
     os.system("mkdir -p %s"%result_path)
 
     competitors = {
-        "DFS": dfs.run_dfs_session,
-        "Q-Learning": q_learning.run_q_learning_session
+        "DFS": partial(dfs.run_dfs_session, backend=config.dfs_backend, prune=config.prune),
+        "Q-Learning": partial(q_learning.run_q_learning_session, prune=config.prune)
     }
+    if config.q_lambda > 0:
+        competitors["Q-Lambda"] = partial(q_learning.run_q_learning_session, prune=config.prune, lam=config.q_lambda)
+    if config.workers > 0:
+        competitors["Parallel-DFS"] = partial(parallel_dfs.run_parallel_dfs_session, num_workers=config.workers)
+    if config.q_workers > 0:
+        competitors["Parallel-Q"] = partial(parallel_q_learning.run_parallel_q_learning_session,
+                                            num_workers=config.q_workers, lam=config.q_lambda or None)
+
+    metrics = MetricsExporter(path=os.path.join(result_path, "metrics.jsonl"),
+                              port=config.metrics_port or None, console=config.progress, interval=5.0)
+
+    cost_model = None
+    if config.costs or config.latency:
+        costs = [float(x) for x in config.costs.split(",")] if config.costs else [1.0, 0.0, 0.0]
+        latency = [float(x) for x in config.latency.split(",")] if config.latency else [0.0, 0.0, 0.0]
+        cost_model = dict(step_cost=costs[0], reset_cost=costs[1], replay_cost=costs[2],
+                          step_latency=latency[0], reset_latency=latency[1], replay_latency=latency[2],
+                          real_sleep=config.real_sleep, enforce_budget=config.cost_budget)
 
     EnvClass = get_env_class(config.env_name)
     evaluate_algorithms(
@@ -36,8 +72,15 @@ def main():
             folder_name = result_path,
             max_depth=config.truncated,     
             total_budget=config.num_steps, 
-            runs=config.runs
+            runs=config.runs,
+            adaptive=config.adaptive,
+            max_runs=config.max_runs,
+            metrics=metrics,
+            memoize=config.memoize,
+            cost_model=cost_model,
+            layout_cache=os.path.join("results", ".layout_cache")
         )
+    metrics.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
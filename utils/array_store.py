@@ -0,0 +1,56 @@
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+def save_arrays(path, **arrays):
+    """
+    用未压缩的 .npz 保存一组数组。
+    未压缩 (ZIP_STORED) 的成员可以按偏移量直接 memmap，加载时不需要解压/拷贝。
+    写到临时文件再 rename，避免中途崩溃留下半个文件。
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+    return path
+
+def load_arrays(path, mmap=True):
+    """
+    读取 save_arrays 写出的 .npz，返回 {name: ndarray}。
+    mmap=True 时每个成员都是只读 np.memmap (np.load 对 .npz 会忽略 mmap_mode)。
+    """
+    if not mmap:
+        with np.load(path, allow_pickle=False) as data:
+            return {k: data[k] for k in data.files}
+
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as raw:
+        for info in zf.infolist():
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                # 压缩过的成员没法 memmap，退回普通读取
+                with zf.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+                continue
+
+            # 跳过 zip local file header (30 字节 + 文件名 + extra)
+            raw.seek(info.header_offset)
+            header = raw.read(30)
+            name_len, extra_len = struct.unpack("<HH", header[26:30])
+            raw.seek(info.header_offset + 30 + name_len + extra_len)
+
+            # 解析 .npy 头拿到 dtype/shape 和数据起始位置
+            version = np.lib.format.read_magic(raw)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(raw)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(raw)
+
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=raw.tell(),
+                                         shape=shape, order="F" if fortran else "C")
+    return arrays
@@ -0,0 +1,101 @@
+import json
+import os
+import random
+
+class SessionCheckpointer:
+    """
+    探索 session 的追加式 checkpoint (JSONL，每行一个记录)。
+
+    每条记录分两部分：
+    - delta: 自上一条记录以来新增的内容 (新边、新模型边、新访问状态、改动过的 Q 值……)，
+      恢复时按顺序拼接，所以单次写入的代价只和增量有关
+    - snapshot: 体积小、每次整体覆盖的内容 (计数器、env 的标量状态、随机数状态、栈等)
+
+    写入后 fsync；崩溃时写了一半的最后一行在加载时会被忽略。
+    """
+    def __init__(self, path, every_steps=1000):
+        self.path = path
+        self.every_steps = every_steps
+        self.last_step = None
+
+    def attach(self, env):
+        """开始记录 env 新探索的边 (EnvMonitor.edge_log)"""
+        env.edge_log = []
+
+    def due(self, env):
+        return self.last_step is None or env.step_counter - self.last_step >= self.every_steps
+
+    def save(self, env, agent, extra=None):
+        raw = env.unwrapped
+        edges = [[int(s), int(a)] for s, a in env.edge_log]
+        env.edge_log = []
+
+        delta, snapshot = agent.checkpoint_state()
+        delta["edges"] = edges
+        snapshot.update({
+            "monitor": {
+                "step_counter": env.step_counter,
+                "reset_counter": getattr(env, 'reset_counter', 0),
+                "replay_counter": getattr(env, 'replay_counter', 0),
+                "last_obs": getattr(env, 'last_obs', None),
+            },
+            "cost": env.cost_model.state_dict() if getattr(env, 'cost_model', None) is not None else None,
+            "profile": env.profiler.state_dict() if getattr(env, 'profiler', None) is not None else None,
+            "env": _env_scalars(raw),
+            "rng": random.getstate(),
+            "extra": extra or {},
+        })
+        record = {"step": env.step_counter, "delta": delta, "snapshot": snapshot}
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.last_step = env.step_counter
+
+    def load(self):
+        """按顺序折叠所有完整记录，没有 checkpoint 时返回 None"""
+        if not os.path.exists(self.path):
+            return None
+        delta, snapshot, step = {}, {}, None
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break # 崩溃时写了一半的记录
+                for key, items in record["delta"].items():
+                    delta.setdefault(key, []).extend(items)
+                snapshot.update(record["snapshot"])
+                step = record["step"]
+        if step is None:
+            return None
+        self.last_step = step
+        return {"step": step, "delta": delta, "snapshot": snapshot}
+
+    def restore_env(self, env, state):
+        """把 env / EnvMonitor 恢复到 checkpoint 时的样子"""
+        raw = env.unwrapped
+        for key, value in state["snapshot"]["env"].items():
+            setattr(raw, key, value)
+        raw.explored_edges = set(tuple(e) for e in state["delta"].get("edges", []))
+
+        monitor = state["snapshot"]["monitor"]
+        env.step_counter = monitor["step_counter"]
+        env.reset_counter = monitor["reset_counter"]
+        env.replay_counter = monitor["replay_counter"]
+        env.last_obs = monitor["last_obs"]
+        env.edge_log = []
+        if state["snapshot"].get("cost") is not None and getattr(env, 'cost_model', None) is not None:
+            env.cost_model.load_state_dict(state["snapshot"]["cost"])
+        if state["snapshot"].get("profile") is not None and getattr(env, 'profiler', None) is not None:
+            env.profiler.load_state_dict(state["snapshot"]["profile"])
+
+        version, internal, gauss = state["snapshot"]["rng"]
+        random.setstate((version, tuple(internal), gauss))
+
+def _env_scalars(raw):
+    """env 的标量属性 (state / current_episode_step / success ...)，足以恢复物理位置"""
+    return {k: v for k, v in vars(raw).items()
+            if not k.startswith("_") and isinstance(v, (bool, int, float, str)) and not isinstance(v, type)}
@@ -0,0 +1,54 @@
+import time
+
+class CostModel:
+    """
+    真机成本模型：step / reset / replay 分别计成本和延迟。
+
+    - *_cost: 每次操作的成本 (任意单位，例如设备秒 / 钱)，累计到 total_cost
+    - *_latency: 每次操作的延迟 (秒)，累计到 device_time；real_sleep=True 时真的 sleep，
+      否则只是虚拟时间，不拖慢评测
+    - enforce_budget=True 时 total_budget 按成本计 (见 EnvMonitor.budget_used)
+
+    默认参数 (step 1，reset / replay 免费) 和按步数计预算等价。
+    由 EnvMonitor 在 step / reset / replay 时调用，内层有 MemoizedEnv 时只对真实执行的回放计费。
+    """
+    def __init__(self, step_cost=1.0, reset_cost=0.0, replay_cost=0.0,
+                 step_latency=0.0, reset_latency=0.0, replay_latency=0.0,
+                 real_sleep=False, enforce_budget=False):
+        self.costs = {"step": step_cost, "reset": reset_cost, "replay": replay_cost}
+        self.latencies = {"step": step_latency, "reset": reset_latency, "replay": replay_latency}
+        self.real_sleep = real_sleep
+        self.enforce_budget = enforce_budget
+        self.total_cost = 0.0
+        self.device_time = 0.0
+        # 按操作类型拆分的成本
+        self.breakdown = {"step": 0.0, "reset": 0.0, "replay": 0.0}
+
+    def charge(self, kind, n=1, sleep=True):
+        """sleep=False：只记账不 sleep (并行 runner 汇总 worker 的操作时，延迟已经在 worker 里发生过)"""
+        cost = self.costs[kind] * n
+        self.total_cost += cost
+        self.breakdown[kind] += cost
+        latency = self.latencies[kind] * n
+        if latency:
+            self.device_time += latency
+            if self.real_sleep and sleep:
+                time.sleep(latency)
+
+    def get_stats(self):
+        return {
+            "cost": self.total_cost,
+            "device_time": self.device_time,
+            "step_cost": self.breakdown["step"],
+            "reset_cost": self.breakdown["reset"],
+            "replay_cost": self.breakdown["replay"],
+        }
+
+    # === checkpoint：总量很小，整体写入快照 ===
+    def state_dict(self):
+        return {"total_cost": self.total_cost, "device_time": self.device_time, "breakdown": dict(self.breakdown)}
+
+    def load_state_dict(self, state):
+        self.total_cost = state["total_cost"]
+        self.device_time = state["device_time"]
+        self.breakdown = dict(state["breakdown"])
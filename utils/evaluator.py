@@ -2,24 +2,130 @@ import numpy as np
 import matplotlib.pyplot as plt
 import gymnasium as gym
 from utils.visualizer import GraphAnimator
+from utils.stats import DEFAULT_CI_TARGET, summarize_runs, ci_converged, ranking_settled, look_alpha
+from utils.oracle import get_coverage_oracle
+from utils.memo_env import MemoizedEnv
+from utils.cost_model import CostModel
+from utils.step_profiler import StepProfiler, STEP_KINDS
 import os
 import sys
 
 class EnvMonitor(gym.Wrapper):
-    def __init__(self, env):
+    def __init__(self, env, metrics=None, cost_model=None, profiler=None):
         super().__init__(env)
         self.step_counter = 0 
+        self.reset_counter = 0
+        self.replay_counter = 0 # 不计入预算的回放步数
+        self.metrics = metrics  # 可选的 MetricsExporter
+        self.cost_model = cost_model  # 可选的 CostModel
+        self.profiler = profiler  # 可选的 StepProfiler (浪费步数归因)
+        # checkpoint 开启时记录新探索的边 (SessionCheckpointer.attach)
+        self.edge_log = None
+        # 新边监听者 callback(state, action, next_state)，例如 GraphAnimator 增量维护图结构
+        self.edge_listeners = []
+        self.last_obs = None
         self.max_possible_edges = 0
         if hasattr(env, 'get_max_edges'):
             self.max_possible_edges = env.get_max_edges()
         
     def reset(self, **kwargs):
         # 保持累计计数
-        return self.env.reset(**kwargs)
+        self.reset_counter += 1
+        if self.metrics is not None: self.metrics.on_reset(self)
+        if self.cost_model is not None: self.cost_model.charge("reset")
+        if self.profiler is not None: self.profiler.on_reset()
+        obs, info = self.env.reset(**kwargs)
+        self.last_obs = obs
+        return obs, info
         
     def step(self, action):
         self.step_counter += 1
-        return self.env.step(action)
+        if self.metrics is not None: self.metrics.on_step(self)
+        if self.cost_model is not None: self.cost_model.charge("step")
+        return self._tracked(self.env.step, action, budgeted=True)
+
+    def shortcut_step(self, action):
+        """智能回溯走已知捷径：和 step 一样计预算，profiler 单独归为 shortcut"""
+        self.step_counter += 1
+        if self.metrics is not None: self.metrics.on_step(self)
+        if self.cost_model is not None: self.cost_model.charge("step")
+        return self._tracked(self.env.step, action, budgeted=True, shortcut=True)
+
+    def replay_step(self, action):
+        """回放已知路径：走 unwrapped，不消耗 Budget，但单独计数"""
+        self.replay_counter += 1
+        if self.metrics is not None: self.metrics.on_replay_step(self)
+        if self.cost_model is not None: self.cost_model.charge("replay")
+        if self.profiler is not None: self.profiler.on_replay()
+        return self._tracked(self.env.unwrapped.step, action)
+
+    def replay_path(self, actions):
+        """
+        回放一整段已知路径，遇到 episode 结束就停下，返回 (state, terminated, truncated)。
+        内层有 MemoizedEnv 时用 fast_forward 跳过已知前缀，只有真实执行的步数计入 replay_counter。
+        """
+        fast_forward = getattr(self.env, 'fast_forward', None)
+        if fast_forward is None:
+            state, terminated, truncated = self.last_obs, False, False
+            for action in actions:
+                state, _, terminated, truncated, _ = self.replay_step(action)
+                if terminated or truncated:
+                    break
+            return state, terminated, truncated
+        
+        real_before = self.env.misses
+        state, terminated, truncated = fast_forward(actions)
+        self.replay_counter += self.env.misses - real_before
+        if self.cost_model is not None: self.cost_model.charge("replay", self.env.misses - real_before)
+        if self.profiler is not None: self.profiler.on_replay(self.env.misses - real_before)
+        self.last_obs = state
+        return state, terminated, truncated
+
+    def merge_worker_counts(self, steps=0, resets=0, replays=0):
+        """
+        并行 runner 汇总 worker 上报的操作 (worker 里的 env 没有 EnvMonitor)：
+        计入计数器，按 CostModel 记账，reset / 回放计入 StepProfiler。
+        """
+        self.step_counter += steps
+        self.reset_counter += resets
+        self.replay_counter += replays
+        if self.metrics is not None:
+            if steps: self.metrics.on_steps(self, steps)
+            if resets or replays: self.metrics.on_resets(self, resets, replays)
+        if self.cost_model is not None:
+            for kind, n in (("step", steps), ("reset", resets), ("replay", replays)):
+                if n: self.cost_model.charge(kind, n, sleep=False)
+        # 步的归类由 runner 负责 (只有它知道哪些是新边)，reset / 回放在这里计入
+        if self.profiler is not None:
+            if resets: self.profiler.on_resets(resets)
+            if replays: self.profiler.on_replay(replays)
+
+    @property
+    def budget_used(self):
+        """算法的预算循环用它判断：默认是计数步数，CostModel(enforce_budget=True) 时是累计成本"""
+        if self.cost_model is not None and self.cost_model.enforce_budget:
+            return self.cost_model.total_cost
+        return self.step_counter
+
+    def _tracked(self, step_fn, action, budgeted=False, shortcut=False):
+        """执行一步并记下观测；开启 edge_log 时把新探索的边追加进去，计预算的步交给 profiler 归类"""
+        profiler = self.profiler if budgeted else None
+        if self.edge_log is None and profiler is None and not self.edge_listeners:
+            result = step_fn(action)
+        else:
+            explored = self.env.unwrapped.explored_edges
+            n_before = len(explored)
+            result = step_fn(action)
+            new_edge = len(explored) > n_before
+            if new_edge and self.edge_log is not None:
+                self.edge_log.append((self.last_obs, int(action)))
+            if new_edge:
+                for listener in self.edge_listeners:
+                    listener(self.last_obs, int(action), result[0])
+            if profiler is not None:
+                profiler.on_step(new_edge, result[3], shortcut)
+        self.last_obs = result[0]
+        return result
     
     def get_stats(self):
         """提取统计数据，包含成功判定"""
@@ -45,78 +151,284 @@ class EnvMonitor(gym.Wrapper):
         # 3. 综合判定是否成功 (兼容 ToyEnv 的 100% 覆盖即成功)
         is_success = explicit_success or (cov >= 99.9)
 
-        return {
+        stats = {
             "steps": self.step_counter,
             "coverage_percent": cov,
-            "is_success": is_success  # [新增指标]
+            "is_success": is_success,  # [新增指标]
+            "resets": self.reset_counter,
+            "replay_steps": self.replay_counter
         }
+        if self.cost_model is not None:
+            stats.update(self.cost_model.get_stats())
+        if self.profiler is not None:
+            stats["profile"] = self.profiler.get_stats(self.step_counter)
+        return stats
     
     def __getattr__(self, name):
         return getattr(self.env, name)
 
-def evaluate_algorithms(env_class, competitors, folder_name, max_depth=10, total_budget=100, runs=10):
-    print(f"\n=== Evaluation (Depth: {max_depth}, Budget: {total_budget}, Runs: {runs}) ===")
-    final_results = {}
+def _run_once(env_class, runner_func, max_depth, total_budget, animator_kwargs=None, metrics=None, memoize=False,
+              cost_model=None):
+    """跑一次完整 session，返回 EnvMonitor 的统计；cost_model 是 CostModel 的参数 (每次 run 新建)"""
+    raw_env = env_class(max_depth=max_depth)
+    if memoize:
+        # 转移记忆：回放时跳过已知前缀
+        raw_env = MemoizedEnv(raw_env)
+    costs = CostModel(**cost_model) if cost_model is not None else None
+    # 步数归因常开：每步只有几次计数
+    profiler = StepProfiler()
+    monitored_env = EnvMonitor(raw_env, metrics=metrics, cost_model=costs, profiler=profiler)
     
-    for algo_name, runner_func in competitors.items():
-        print(f"Testing {algo_name}...", end="", flush=True)
-        
-        steps_hist = []
-        cov_hist = []
-        success_count = 0 # [新增计数]
-        
+    animator = None
+    if animator_kwargs is not None:
+        # 流式编码：帧直接写入 GIF，不落盘临时 PNG
+        animator = GraphAnimator(monitored_env, **animator_kwargs)
+    
+    result = runner_func(
+        monitored_env, 
+        animator=animator, 
+        total_budget=total_budget
+    )
+    profiler.stop()
+    
+    if animator:
+        animator.close()
+    
+    stats = monitored_env.get_stats()
+    # DFS / Q-Learning 返回 agent：开启剪枝时带上剪枝统计，由报告按算法汇总输出
+    pruner = getattr(result, 'pruner', None)
+    if pruner is not None:
+        stats["prune"] = pruner.get_stats()
+    # 并行 runner 额外返回墙钟时间和覆盖吞吐
+    if isinstance(result, dict):
+        for key in ("workers", "wall_time", "coverage_per_sec", "dead_workers"):
+            if key in result:
+                stats[key] = result[key]
+    return stats
+
+def evaluate_algorithms(env_class, competitors, folder_name, max_depth=10, total_budget=100, runs=10,
+                        adaptive=False, min_runs=10, max_runs=1000, batch_runs=5,
+                        ci_target=None, confidence=0.95, metrics=None, memoize=False, cost_model=None,
+                        layout_cache=None, primary_metric="avg_steps"):
+    """
+    adaptive=False: 每个算法固定跑 runs 次。
+    adaptive=True: 忽略 runs，先每个算法跑 min_runs 次，之后每轮追加 batch_runs 次，
+        直到所有指标的置信区间半宽都小于 ci_target，或者算法之间的排名已在统计上确定，
+        最多 max_runs 次。ci_target 的 avg_steps 以 total_budget 的比例给出。
+        排名只看 primary_metric，用 O'Brien-Fleming 型 alpha 消耗函数做序贯检验 (见 utils/stats.py)，
+        多次查看 / 多个组合合起来误判 "排名已确定" 的概率不超过 1 - confidence。
+    metrics: 可选的 MetricsExporter，实时输出吞吐 / 覆盖率 / ETA (由调用方负责 close)。
+    memoize: 用 MemoizedEnv 包装 env，DFS 回放时跳过已知转移。
+    cost_model: CostModel 的参数 dict。报告里增加平均成本 / 每 1% 覆盖率的成本，并按后者排名；
+        其中 enforce_budget=True 时 total_budget 按成本计 (并行算法仍按步数)。
+    layout_cache: 动画布局的缓存目录，同一张图的所有算法 / 多次评测共用一套节点坐标。
+    """
+    if adaptive:
+        print(f"\n=== Evaluation (Depth: {max_depth}, Budget: {total_budget}, "
+              f"Adaptive Runs: {min_runs}..{max_runs}, Confidence: {confidence}) ===")
+    else:
+        print(f"\n=== Evaluation (Depth: {max_depth}, Budget: {total_budget}, Runs: {runs}) ===")
+    
+    # 有限图 env：预先算出最优覆盖步数下界 (按 env 缓存)
+    oracle = get_coverage_oracle(env_class(max_depth=max_depth))
+    if oracle is not None:
+        print(f"Optimal coverage lower bound: {oracle.bound} steps ({oracle.num_edges} edges)")
+    
+    if metrics is not None:
+        # 自适应模式先只计划第一轮，之后每追加一轮 plan_runs 一次；max_runs 只作为 ETA 上限
+        if adaptive:
+            metrics.begin_sweep(min(min_runs, max_runs) * len(competitors), total_budget,
+                                runs_max=max_runs * len(competitors))
+        else:
+            metrics.begin_sweep(runs * len(competitors), total_budget)
+    
+    # 每个算法的原始记录
+    history = {}
+    for algo_name in competitors:
+        history[algo_name] = {"steps": [], "cov": [], "success": [], "opt_ratio": [], "cost": [], "device_time": [],
+                              "profile": [], "wall_time": [], "cov_per_sec": [], "dead_workers": [],
+                              "prune": []}
+    cost_budget = cost_model is not None and cost_model.get("enforce_budget", False)
+    
+    def run_batch(algo_name, n):
+        runner_func = competitors[algo_name]
+        hist = history[algo_name]
         safe_name = algo_name.replace(" ", "_").lower()
-        temp_dir = f"temp_frames_{safe_name}"
-        
-        for i in range(runs):
-            raw_env = env_class(max_depth=max_depth)
-            monitored_env = EnvMonitor(raw_env)
-            
-            animator = None
-            if i == 0:
-                animator = GraphAnimator(monitored_env, temp_dir=temp_dir)
-            
-            runner_func(
-                monitored_env, 
-                animator=animator, 
-                total_budget=total_budget
-            )
+        for _ in range(n):
+            animator_kwargs = None
+            if not hist["steps"]:
+                animator_kwargs = dict(output_dir=folder_name, filename_prefix=f"eval_{safe_name}", fps=4,
+                                       layout_cache=layout_cache)
             
-            if i == 0 and animator:
-                animator.create_gif(folder_name,f"eval_{safe_name}", fps=4)
-            
-            stats = monitored_env.get_stats()
-            
-            # 记录数据
-            steps_hist.append(min(stats['steps'], total_budget))
-            cov_hist.append(stats['coverage_percent'])
+            if metrics is not None: metrics.begin_run(algo_name, len(hist["steps"]))
+            stats = _run_once(env_class, runner_func, max_depth, total_budget, animator_kwargs, metrics, memoize,
+                              cost_model)
+            if metrics is not None: metrics.end_run(stats)
             
+            # 记录数据 (预算按成本计时步数不截断)
+            hist["steps"].append(stats['steps'] if cost_budget else min(stats['steps'], total_budget))
+            if cost_model is not None:
+                hist["cost"].append(stats['cost'])
+                hist["device_time"].append(stats['device_time'])
+            hist["cov"].append(stats['coverage_percent'])
+            hist["profile"].append(stats['profile'])
+            if 'prune' in stats:
+                hist["prune"].append(stats['prune'])
+            if 'coverage_per_sec' in stats:
+                hist["wall_time"].append(stats['wall_time'])
+                hist["cov_per_sec"].append(stats['coverage_per_sec'])
+                hist["dead_workers"].append(stats.get('dead_workers', 0))
             # [新增] 统计成功
-            if stats['is_success']:
-                success_count += 1
-            
-        print(" Done.")
+            hist["success"].append(bool(stats['is_success']))
+            # 只有完成覆盖的 run 才有意义：下界按每次走边计，所以分子是计预算的步 + 回放步
+            if oracle is not None and oracle.bound > 0 and stats['is_success']:
+                hist["opt_ratio"].append((stats['steps'] + stats['replay_steps']) / oracle.bound)
+    
+    def summarize(algo_name):
+        hist = history[algo_name]
+        res = summarize_runs(hist["steps"], hist["cov"], hist["success"], confidence)
+        res["opt_ratio"] = np.mean(hist["opt_ratio"]) if hist["opt_ratio"] else float("nan")
+        if cost_model is not None:
+            res["avg_cost"] = float(np.mean(hist["cost"]))
+            res["avg_device_time"] = float(np.mean(hist["device_time"]))
+            # 成本 / 覆盖率：每 1% 覆盖率花多少成本
+            res["cost_per_cov"] = res["avg_cost"] / res["avg_cov"] if res["avg_cov"] > 0 else float("inf")
+        res["profile"] = _average_profile(hist["profile"])
+        if hist["cov_per_sec"]:
+            res["wall_time"] = float(np.mean(hist["wall_time"]))
+            res["coverage_per_sec"] = float(np.mean(hist["cov_per_sec"]))
+            res["dead_workers"] = int(np.sum(hist["dead_workers"]))
+        if hist["prune"]:
+            res["prune"] = {key: float(np.mean([p[key] for p in hist["prune"]])) for key in hist["prune"][0]}
+        return res
+    
+    if not adaptive:
+        for algo_name in competitors:
+            # 控制台进度行会另起一行输出
+            console = metrics is not None and metrics.console
+            print(f"Testing {algo_name}...", end="\n" if console else "", flush=True)
+            run_batch(algo_name, runs)
+            print(" Done.")
+    else:
+        target = dict(DEFAULT_CI_TARGET, **(ci_target or {}))
+        target["avg_steps"] = target["avg_steps"] * total_budget
         
-        final_results[algo_name] = {
-            "avg_steps": np.mean(steps_hist),
-            "std_steps": np.std(steps_hist),
-            "avg_cov": np.mean(cov_hist),
-            "success_rate": (success_count / runs) * 100.0 # [新增计算]
-        }
+        # 第一轮：每个算法先跑 min_runs 次
+        n = min(min_runs, max_runs)
+        for algo_name in competitors:
+            run_batch(algo_name, n)
+        
+        n_prev = 0
+        while True:
+            summaries = {name: summarize(name) for name in competitors}
+            converged = [name for name in competitors if ci_converged(summaries[name], target)]
+            alpha = look_alpha(n, n_prev, max_runs, 1.0 - confidence)
+            n_prev = n
+            settled = ranking_settled(summaries, alpha, primary_metric)
+            print(f"  [Adaptive] runs={n} converged={len(converged)}/{len(competitors)} "
+                  f"ranking_settled={settled}", flush=True)
+            
+            if settled or len(converged) == len(competitors) or n >= max_runs:
+                break
+            
+            step = min(batch_runs, max_runs - n)
+            if metrics is not None:
+                metrics.plan_runs(step * (len(competitors) - len(converged)))
+            # 已收敛的算法不再追加 run，把预算留给还没收敛的算法
+            for algo_name in competitors:
+                if algo_name not in converged:
+                    run_batch(algo_name, step)
+            n += step
+    
+    final_results = {name: summarize(name) for name in competitors}
 
     # --- 输出文本报告 ---
     print("\n" + "="*75)
     # 调整列宽以容纳新指标
     header = f"{'Algorithm':<15} | {'Avg Steps':<10} | {'Avg Cov %':<10} | {'Success Rate %':<15}"
+    if oracle is not None:
+        header += f" | {'Moves/Opt':<9}"
+    if cost_model is not None:
+        header += f" | {'Avg Cost':<10} | {'Cost/Cov%':<10}"
+    if adaptive:
+        header += f" | {'Runs':<6}"
     print(header)
     print("-" * 75)
     for name, res in final_results.items():
         row = f"{name:<15} | {res['avg_steps']:<10.1f} | {res['avg_cov']:<10.1f} | {res['success_rate']:<15.1f}"
+        if oracle is not None:
+            ratio = "n/a" if np.isnan(res['opt_ratio']) else f"{res['opt_ratio']:.2f}"
+            row += f" | {ratio:<9}"
+        if cost_model is not None:
+            row += f" | {res['avg_cost']:<10.1f} | {res['cost_per_cov']:<10.2f}"
+        if adaptive:
+            row += f" | {res['runs']:<6d}"
         print(row)
+    if oracle is not None:
+        print("Moves/Opt = (budgeted steps + replay steps) / optimal coverage lower bound, successful runs only")
+    if adaptive:
+        print("-" * 75)
+        print(f"{confidence*100:.0f}% CI half-width:")
+        for name, res in final_results.items():
+            ci = res['ci']
+            print(f"{name:<15} | ±{ci['avg_steps']:<9.2f} | ±{ci['avg_cov']:<9.2f} | ±{ci['success_rate']:<14.2f}")
+    if cost_model is not None:
+        print("-" * 75)
+        ranking = sorted(final_results, key=lambda n: final_results[n]['cost_per_cov'])
+        print("Ranking by cost-to-coverage: " + " < ".join(ranking))
+        if any(final_results[n]['avg_device_time'] for n in ranking):
+            print("Avg device time (s): " + ", ".join(
+                f"{n} {final_results[n]['avg_device_time']:.1f}" for n in ranking))
+    parallel = [n for n in final_results if "coverage_per_sec" in final_results[n]]
+    if parallel:
+        print("-" * 75)
+        print("Parallel throughput (avg per run): " + ", ".join(
+            f"{n} {final_results[n]['coverage_per_sec']:.2f} %/s in {final_results[n]['wall_time']:.2f}s"
+            for n in parallel))
+        for n in parallel:
+            if final_results[n]["dead_workers"]:
+                print(f"  {n}: {final_results[n]['dead_workers']} worker process(es) exited early")
+    pruned = [n for n in final_results if "prune" in final_results[n]]
+    if pruned:
+        print("-" * 75)
+        print("Action pruning (avg per run):")
+        for n in pruned:
+            print(f"{n:<15} | " + ", ".join(f"{k} {v:.1f}" for k, v in final_results[n]["prune"].items()))
+    _print_attribution(final_results)
     print("="*75)
     
     # --- 绘制图表 (增加第3张图) ---
     _plot_results(folder_name, final_results)
+    return final_results
+
+def _average_profile(profiles):
+    """每个 run 的 StepProfiler 统计取平均 (阶段耗时按阶段名对齐)"""
+    avg = {}
+    for key in STEP_KINDS + ("untracked", "resets", "replays"):
+        avg[key] = float(np.mean([p.get(key, 0) for p in profiles]))
+    phases = set(name for p in profiles for name in p["phase_time"])
+    avg["phase_time"] = {name: float(np.mean([p["phase_time"].get(name, 0.0) for p in profiles]))
+                         for name in phases}
+    return avg
+
+def _print_attribution(results):
+    """每个算法的步数去向 (占计预算步数的百分比) 和各阶段耗时"""
+    print("-" * 75)
+    print("Step attribution (avg per run, % of budgeted steps):")
+    print(f"{'Algorithm':<15} | {'New':<6} | {'Repeat':<6} | {'Shortcut':<8} | {'Trunc':<6} | "
+          f"{'Other':<6} | {'Resets':<7} | {'Replays':<7}")
+    for name, res in results.items():
+        prof = res["profile"]
+        total = sum(prof[k] for k in STEP_KINDS) + prof["untracked"]
+        pct = lambda k: 100.0 * prof[k] / total if total else 0.0
+        print(f"{name:<15} | {pct('new_edge'):<6.1f} | {pct('repeat'):<6.1f} | {pct('shortcut'):<8.1f} | "
+              f"{pct('truncation_loss'):<6.1f} | {pct('untracked'):<6.1f} | {prof['resets']:<7.1f} | "
+              f"{prof['replays']:<7.1f}")
+    print("Phase time (avg ms per run):")
+    for name, res in results.items():
+        phases = sorted(res["profile"]["phase_time"].items(), key=lambda item: -item[1])
+        if phases:
+            print(f"{name:<15} | " + ", ".join(f"{p} {t * 1000:.1f}" for p, t in phases))
 
 def _plot_results(folder_name, results):
     names = list(results.keys())
@@ -0,0 +1,170 @@
+import math
+import os
+import zlib
+from collections import deque
+
+import networkx as nx
+import numpy as np
+
+from utils.array_store import save_arrays, load_arrays
+
+# spring_layout 在 500 个节点以上会改用依赖 scipy 的稀疏实现，批量微调只在这个规模以下做
+_SPRING_MAX_NODES = 400
+# 同一个父节点的第 k 个子节点相对父节点朝向的偏转角：0, +, -, ++, --, ...
+_FAN_STEP = 0.6
+
+def layout_cache_key(env):
+    """每张 env 图一个缓存文件：类名，文件图再加路径的 crc (不同目录下的同名文件不冲突)"""
+    raw = getattr(env, "unwrapped", env)
+    key = type(raw).__name__
+    path = getattr(raw, "path", None)
+    if path:
+        key += "_%08x" % (zlib.crc32(os.path.abspath(path).encode()) & 0xffffffff)
+    return key
+
+class LayoutEngine:
+    """
+    增量布局：只给新出现的节点算坐标，已有节点的坐标永远不动 (动画里节点不会跳)。
+
+    - 新节点放在已放置的前驱旁边：沿前驱自己的朝向继续延伸，同一前驱的多个子节点左右展开，
+      所以链 (Hard 的 Month 链) 排成直线，树排成扇形
+    - 找不到已放置前驱的节点放在已有布局外圈的螺旋上
+    - 一次新增 >= batch_size 个节点时 (例如从断点开始画、大图一次展开)，
+      对新节点及其邻居跑一次 spring_layout 微调，老节点固定不动 (子图超过 _SPRING_MAX_NODES 时跳过)
+    pinned: {name: (x, y)} 预设坐标 (Toy 的美观布局等)。
+    坐标按节点名存，可以 save / load 到磁盘，同一张图的多次运行 / 多个算法共用一个布局。
+    """
+    def __init__(self, pinned=None, spacing=1.0, batch_size=20, spring_iterations=30):
+        self.pinned = dict(pinned or {})
+        self.spacing = spacing
+        self.batch_size = batch_size
+        self.spring_iterations = spring_iterations
+        # {name: (x, y)}，{name: 朝向 (弧度)}，{name: 已放置的子节点数}
+        self.pos = {}
+        self.heading = {}
+        self.fanout = {}
+        self._radius = 0.0 # 已有布局离原点的最远距离，外圈螺旋从这里开始
+        self._spiral = 0
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.pos)
+
+    def __contains__(self, name):
+        return name in self.pos
+
+    def place(self, names, edges=()):
+        """
+        names: 需要有坐标的节点名；edges: 已知的 (u, v) 有向边 (节点名)，用来找前驱。
+        返回本次新放置的节点数。
+        """
+        new = [n for n in names if n not in self.pos]
+        if not new:
+            return 0
+        new_set = set(new)
+        # 只关心指向新节点的边
+        succ = {}
+        for u, v in edges:
+            if v in new_set and u != v:
+                succ.setdefault(u, []).append(v)
+
+        for name in new:
+            if name in self.pinned:
+                self._put(name, self.pinned[name], 0.0)
+        # 从已放置的节点出发按 BFS 顺序放，链和树一次就能展开
+        queue = deque(u for u in succ if u in self.pos)
+        pending = deque(new)
+        while True:
+            while queue:
+                u = queue.popleft()
+                for v in succ.get(u, ()):
+                    if v not in self.pos:
+                        self._put_child(u, v)
+                        queue.append(v)
+            # 剩下的找不到前驱：放外圈，再从它继续展开
+            while pending and pending[0] in self.pos:
+                pending.popleft()
+            if not pending:
+                break
+            orphan = pending.popleft()
+            self._put_orphan(orphan)
+            queue.append(orphan)
+
+        if len(new) >= self.batch_size:
+            self._relax(new, edges)
+        self.dirty = True
+        return len(new)
+
+    def _put(self, name, xy, heading):
+        x, y = float(xy[0]), float(xy[1])
+        self.pos[name] = (x, y)
+        self.heading[name] = heading
+        self._radius = max(self._radius, math.hypot(x, y))
+
+    def _put_child(self, parent, name):
+        k = self.fanout.get(parent, 0)
+        self.fanout[parent] = k + 1
+        offset = _FAN_STEP * ((k + 1) // 2) * (1 if k % 2 else -1)
+        angle = self.heading[parent] + offset
+        px, py = self.pos[parent]
+        self._put(name, (px + self.spacing * math.cos(angle), py + self.spacing * math.sin(angle)), angle)
+
+    def _put_orphan(self, name):
+        # 黄金角螺旋，半径从已有布局外面开始
+        self._spiral += 1
+        angle = self._spiral * 2.399963
+        r = self._radius + self.spacing
+        self._put(name, (r * math.cos(angle), r * math.sin(angle)), angle)
+
+    def _relax(self, new, edges):
+        """批量模式：新节点 + 相邻的老节点组成子图跑 spring_layout，老节点固定"""
+        new_set = set(new)
+        sub = nx.Graph()
+        sub.add_nodes_from(new)
+        for u, v in edges:
+            if u != v and (u in new_set or v in new_set) and u in self.pos and v in self.pos:
+                sub.add_edge(u, v)
+        if len(sub) > _SPRING_MAX_NODES:
+            # 太大就保留增量放置的结果
+            return
+        fixed = [n for n in sub if n not in new_set or n in self.pinned]
+        init = {n: self.pos[n] for n in sub}
+        relaxed = nx.spring_layout(sub, pos=init, fixed=fixed or None, k=self.spacing,
+                                   iterations=self.spring_iterations, seed=0)
+        if not fixed:
+            # 没有固定点时 spring_layout 会把结果缩放到 [-1, 1]，平移回原来的重心
+            center = np.mean([init[n] for n in sub], axis=0)
+            relaxed = {n: center + p * self.spacing * math.sqrt(len(sub)) for n, p in relaxed.items()}
+        for n in new:
+            if n not in self.pinned:
+                self._put(n, relaxed[n], self.heading[n])
+
+    def positions(self, names):
+        """按 names 的顺序返回 (N, 2) 坐标数组"""
+        if not names:
+            return np.empty((0, 2))
+        return np.array([self.pos[n] for n in names], dtype=float)
+
+    # === 磁盘缓存 ===
+    def save(self, path):
+        if not self.dirty:
+            return
+        names = list(self.pos)
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        save_arrays(path, names=np.array(names, dtype=str), xy=self.positions(names),
+                    heading=np.array([self.heading[n] for n in names], dtype=float),
+                    fanout=np.array([self.fanout.get(n, 0) for n in names], dtype=np.int64))
+        self.dirty = False
+
+    def load(self, path):
+        """读取缓存的坐标 (文件不存在时什么都不做)，返回读到的节点数"""
+        if not os.path.exists(path):
+            return 0
+        data = load_arrays(path, mmap=False)
+        for name, xy, heading, fanout in zip(data["names"].tolist(), data["xy"], data["heading"], data["fanout"]):
+            self._put(name, xy, float(heading))
+            if fanout:
+                self.fanout[name] = int(fanout)
+        return len(data["names"])
@@ -0,0 +1,111 @@
+from collections import OrderedDict
+
+import gymnasium as gym
+
+class MemoizedEnv(gym.Wrapper):
+    """
+    转移记忆包装器：缓存 (state, action) -> (next_state, reward, terminated)，容量有限 (LRU)。
+
+    fast_forward(actions) 用缓存沿动作前缀走到已知的最远状态，通过 env.set_state 一次跳过去，
+    只有剩下的未知后缀才真正调用 env。env 没有 set_state 时退化为逐步执行 (仍会填充缓存)。
+
+    同一个 (state, action) 真实执行得到不同 next_state 时视为不确定：删除缓存项，
+    之后这条边总是真实执行。reward 随覆盖历史变化，不参与一致性判断。
+
+    放在 EnvMonitor 里面：EnvMonitor(MemoizedEnv(raw_env))。
+    """
+    def __init__(self, env, max_entries=100000):
+        super().__init__(env)
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._unstable = set()
+        self._state = None
+        self.hits = 0
+        self.misses = 0
+        self.jumps = 0
+        self.skipped_steps = 0
+        self.invalidations = 0
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self._state = obs
+        return obs, info
+
+    def step(self, action):
+        return self._real_step(self.env.step, action)
+
+    def _real_step(self, step_fn, action):
+        key = (self._state, int(action))
+        next_state, reward, terminated, truncated, info = step_fn(action)
+
+        if key in self._unstable:
+            pass
+        elif key in self._cache:
+            if self._cache[key][0] != next_state:
+                # 不确定的转移：缓存作废，以后总是真实执行
+                del self._cache[key]
+                self._unstable.add(key)
+                self.invalidations += 1
+            else:
+                self._cache.move_to_end(key)
+        else:
+            self._cache[key] = (next_state, reward, terminated)
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+        self._state = next_state
+        return next_state, reward, terminated, truncated, info
+
+    def lookup(self, state, action):
+        """命中返回 (next_state, reward, terminated)，否则 None"""
+        return self._cache.get((state, int(action)))
+
+    def fast_forward(self, actions):
+        """
+        从当前状态回放 actions (不经过上层 EnvMonitor，不消耗 Budget)。
+        返回 (state, terminated, truncated)，遇到 episode 结束就停下。
+        """
+        raw = self.env.unwrapped
+        end, known, terminated = self._state, 0, False
+        if hasattr(raw, 'set_state'):
+            for action in actions:
+                entry = self._cache.get((end, int(action)))
+                if entry is None:
+                    break
+                self._cache.move_to_end((end, int(action)))
+                end, _, terminated = entry
+                known += 1
+                if terminated:
+                    break
+
+        truncated = False
+        if known:
+            self.hits += known
+            self.jumps += 1
+            self.skipped_steps += known
+            episode_step = getattr(raw, 'current_episode_step', 0) + known
+            raw.set_state(end, episode_step)
+            self._state = end
+            truncated = episode_step >= getattr(raw, 'max_depth', float('inf'))
+            if terminated or truncated:
+                return end, terminated, truncated
+
+        for action in actions[known:]:
+            self.misses += 1
+            end, _, terminated, truncated, _ = self._real_step(raw.step, action)
+            if terminated or truncated:
+                break
+        return end, terminated, truncated
+
+    def get_memo_stats(self):
+        return {
+            "cache_entries": len(self._cache),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "jumps": self.jumps,
+            "skipped_replay_steps": self.skipped_steps,
+            "invalidations": self.invalidations,
+        }
+
+    def __getattr__(self, name):
+        return getattr(self.env, name)
@@ -0,0 +1,226 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class MetricsExporter:
+    """
+    长时间评测的实时指标：
+    - 滚动 JSONL 文件 (超过 max_bytes 轮转为 .1)，每 interval 秒写一条 step 快照，每个 run 结束写一条
+    - 可选的本地 HTTP 端点 (Prometheus 文本格式)，GET /metrics
+    - 可选的控制台进度行 (吞吐 + ETA)
+
+    EnvMonitor 每步调用 on_step，只做计数和一次时间比较，可以常开；并行 runner 按批汇总时调用 on_steps。
+    自适应评测的 run 数事先不确定：runs_planned 是已经排进计划的 run 数 (每追加一轮 plan_runs 一次)，
+    runs_max 是上限，ETA 分别按两者给出 (eta_sec 是已排计划的剩余时间，eta_max_sec 是最坏情况)。
+    """
+    def __init__(self, path=None, port=None, interval=1.0, max_bytes=10 * 1024 * 1024, console=False):
+        self.path = path
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.console = console
+
+        self.runs_planned = 0
+        self.runs_max = None
+        self.runs_done = 0
+        self.total_budget = 0
+        self.algo = ""
+        self.run_index = 0
+        self.total_steps = 0
+        self.total_resets = 0
+        self.total_replay_steps = 0
+        self.success_count = 0
+        self.run = {"steps": 0, "coverage_percent": 0.0, "resets": 0, "replay_steps": 0}
+
+        self.start_time = time.time()
+        self._last_time = self.start_time
+        self._last_steps = 0
+        self._next_flush = self.start_time + interval
+        self.steps_per_sec = 0.0
+
+        self._server = None
+        if port:
+            self._start_server(port)
+
+    # === 生命周期 ===
+    def begin_sweep(self, runs_planned, total_budget, runs_max=None):
+        self.runs_planned = runs_planned
+        self.runs_max = runs_max
+        self.total_budget = total_budget
+        self.start_time = self._last_time = time.time()
+
+    def plan_runs(self, n):
+        """自适应评测追加一轮 run 时调用"""
+        self.runs_planned += n
+
+    def begin_run(self, algo, run_index):
+        self.algo = algo
+        self.run_index = run_index
+        self.run = {"steps": 0, "coverage_percent": 0.0, "resets": 0, "replay_steps": 0}
+
+    def on_step(self, monitor):
+        self.total_steps += 1
+        self.run["steps"] = monitor.step_counter
+        now = time.time()
+        if now >= self._next_flush:
+            self._refresh(monitor, now)
+            self._emit("step")
+
+    def on_steps(self, monitor, n):
+        """并行 runner 一次汇总 n 步"""
+        self.total_steps += n - 1
+        self.on_step(monitor)
+
+    def on_reset(self, monitor):
+        self.total_resets += 1
+        self.run["resets"] = monitor.reset_counter
+
+    def on_replay_step(self, monitor):
+        self.total_replay_steps += 1
+        self.run["replay_steps"] = monitor.replay_counter
+
+    def on_resets(self, monitor, resets, replays):
+        """并行 runner 一次汇总的 reset / 回放步数"""
+        self.total_resets += resets
+        self.total_replay_steps += replays
+        self.run["resets"] = monitor.reset_counter
+        self.run["replay_steps"] = monitor.replay_counter
+
+    def end_run(self, stats):
+        self.runs_done += 1
+        if stats.get("is_success"):
+            self.success_count += 1
+        self.run.update({
+            "steps": stats.get("steps", 0),
+            "coverage_percent": stats.get("coverage_percent", 0.0),
+            "resets": stats.get("resets", 0),
+            "replay_steps": stats.get("replay_steps", 0),
+            "is_success": bool(stats.get("is_success")),
+        })
+        self._refresh(None, time.time())
+        self._emit("run_end")
+
+    def close(self):
+        self._emit("sweep_end")
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    # === 快照 ===
+    def _refresh(self, monitor, now):
+        dt = now - self._last_time
+        if dt > 0:
+            self.steps_per_sec = (self.total_steps - self._last_steps) / dt
+        self._last_time, self._last_steps = now, self.total_steps
+        self._next_flush = now + self.interval
+        if monitor is not None:
+            stats = monitor.get_stats()
+            self.run["coverage_percent"] = stats["coverage_percent"]
+
+    def eta_seconds(self, runs=None):
+        """按预算折算进度：已完成 run + 当前 run 已用预算比例；runs 默认是已排计划的 run 数"""
+        runs = runs or self.runs_planned
+        if not runs:
+            return None
+        partial = min(self.run["steps"] / self.total_budget, 1.0) if self.total_budget else 0.0
+        progress = (self.runs_done + partial) / runs
+        if progress <= 0:
+            return None
+        elapsed = time.time() - self.start_time
+        return max(elapsed / progress - elapsed, 0.0)
+
+    def snapshot(self, event="step"):
+        elapsed = time.time() - self.start_time
+        return {
+            "ts": time.time(),
+            "event": event,
+            "algo": self.algo,
+            "run": self.run_index,
+            "runs_done": self.runs_done,
+            "runs_planned": self.runs_planned,
+            "runs_max": self.runs_max,
+            "run_steps": self.run["steps"],
+            "run_coverage_percent": self.run["coverage_percent"],
+            "run_resets": self.run["resets"],
+            "run_replay_steps": self.run["replay_steps"],
+            "total_steps": self.total_steps,
+            "total_resets": self.total_resets,
+            "total_replay_steps": self.total_replay_steps,
+            "success_count": self.success_count,
+            "steps_per_sec": self.steps_per_sec,
+            "avg_steps_per_sec": self.total_steps / elapsed if elapsed > 0 else 0.0,
+            "elapsed_sec": elapsed,
+            "eta_sec": self.eta_seconds(),
+            "eta_max_sec": self.eta_seconds(self.runs_max) if self.runs_max else None,
+        }
+
+    def _emit(self, event):
+        snap = self.snapshot(event)
+        if self.path:
+            self._rotate()
+            with open(self.path, "a") as f:
+                f.write(json.dumps(snap) + "\n")
+        if self.console:
+            eta = snap["eta_sec"]
+            fmt = lambda t: time.strftime("%H:%M:%S", time.gmtime(t)) if t is not None else "--:--:--"
+            eta_str = fmt(eta)
+            if snap["eta_max_sec"] is not None:
+                eta_str += f" (max {fmt(snap['eta_max_sec'])})"
+            print(f"  [Metrics] {snap['algo']} run {snap['runs_done']}/{snap['runs_planned']} | "
+                  f"{snap['steps_per_sec']:.0f} steps/s | cov {snap['run_coverage_percent']:.1f}% | "
+                  f"ETA {eta_str}", flush=True)
+
+    def _rotate(self):
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            os.replace(self.path, self.path + ".1")
+
+    # === HTTP ===
+    def render_text(self):
+        """Prometheus 文本格式"""
+        snap = self.snapshot()
+        label = f'{{algo="{snap["algo"]}"}}'
+        lines = []
+        for key, kind, help_str in (
+            ("total_steps", "counter", "Counted env steps across all runs"),
+            ("total_resets", "counter", "Env resets across all runs"),
+            ("total_replay_steps", "counter", "Uncounted replay steps across all runs"),
+            ("success_count", "counter", "Successful runs"),
+            ("runs_done", "counter", "Finished runs"),
+            ("runs_planned", "gauge", "Scheduled runs (grows batch by batch in adaptive mode)"),
+            ("runs_max", "gauge", "Upper bound on runs in adaptive mode"),
+            ("run_steps", "gauge", "Steps in the current run"),
+            ("run_coverage_percent", "gauge", "Coverage of the current run"),
+            ("steps_per_sec", "gauge", "Recent throughput"),
+            ("elapsed_sec", "gauge", "Seconds since the sweep started"),
+            ("eta_sec", "gauge", "Estimated seconds until the scheduled runs finish"),
+            ("eta_max_sec", "gauge", "Estimated seconds if every adaptive run up to runs_max is needed"),
+        ):
+            value = snap[key]
+            if value is None:
+                continue
+            name = f"rltg_{key}"
+            lines.append(f"# HELP {name} {help_str}")
+            lines.append(f"# TYPE {name} {kind}")
+            # 只有当前 run 的指标带算法标签，累计值跨算法
+            lines.append(f"{name}{label if key.startswith('run_') else ''} {value}")
+        return "\n".join(lines) + "\n"
+
+    def _start_server(self, port):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = exporter.render_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
@@ -0,0 +1,155 @@
+import networkx as nx
+import numpy as np
+
+# 按 (env 类, 图结构) 缓存，同一个 env 的多次 run 只算一次
+_ORACLE_CACHE = {}
+
+class CoverageOracle:
+    """
+    有限图 env 的最优覆盖下界。
+
+    - 最短路：在 CSR 邻接表上做按层推进的数组 BFS (多个源同时推进)，
+      只从起点出发 (下界只需要起点到各节点的距离)；distance() 需要其它源时按需计算并缓存
+    - 覆盖下界：有向中国邮路 + 免费 reset。
+      reset 可以从任意节点免费回到任一起点，所以最少步数 =
+      可达边数 + 把图补成欧拉图所需的最小额外步数 (以入出度差为需求的最小费用流)。
+      max_depth 截断被松弛掉，多起点 env 视为可以选择 reset 落点，因此仍是合法下界。
+
+    下界按每一次走边计 (回放也是真实走边)，和它比较时要用 EnvMonitor 的
+    计预算步数 + 回放步数 (replay_steps)，否则依赖回放的算法 (DFS) 的比值可能小于 1。
+    """
+    def __init__(self, transitions, start_states):
+        # 稠密编号
+        nodes = set(transitions.keys())
+        for acts in transitions.values():
+            nodes.update(acts.values())
+        self.node_ids = np.array(sorted(nodes), dtype=np.int64)
+        self.index = {s: i for i, s in enumerate(self.node_ids.tolist())}
+        n = len(self.node_ids)
+
+        src, dst = [], []
+        for s, acts in transitions.items():
+            for nxt in acts.values():
+                src.append(self.index[s])
+                dst.append(self.index[nxt])
+        self.src = np.array(src, dtype=np.int64)
+        self.dst = np.array(dst, dtype=np.int64)
+        self.starts = np.array([self.index[s] for s in start_states if s in self.index], dtype=np.int64)
+        self.num_edges = 0
+
+        self.indptr, self.indices = self._csr(n, self.src, self.dst)
+        # 起点到各节点的距离 (len(starts), n)；其它源的距离行按需算 {源下标: 距离行}
+        self.dist = self._bfs(self.indptr, self.indices, self.starts)
+        self._rows = {}
+        self.bound = self._cover_bound()
+
+    @staticmethod
+    def _csr(n, src, dst):
+        """去重后的 CSR 邻接 (多条动作指向同一节点只算一次)"""
+        order = np.lexsort((dst, src))
+        src, dst = src[order], dst[order]
+        keep = np.ones(len(src), dtype=bool)
+        keep[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src[keep], minlength=n), out=indptr[1:])
+        return indptr, dst[keep]
+
+    @staticmethod
+    def _bfs(indptr, indices, sources, block=256):
+        """
+        从 sources 同时 BFS，返回 (len(sources), n) 的 int32 距离矩阵，-1 表示不可达。
+        按 block 个源一组推进；每层的新 frontier 直接由本层新标记的 (源, 节点) 去重得到，
+        总代价和 (源数 x 边数) 成正比，不随深度重扫整个矩阵。
+        """
+        n = len(indptr) - 1
+        dist = np.full((len(sources), n), -1, dtype=np.int32)
+        for b0 in range(0, len(sources), block):
+            sub = dist[b0:b0 + block]
+            rows = np.arange(len(sub))
+            f_src, f_node = rows, np.asarray(sources[b0:b0 + block], dtype=np.int64)
+            sub[f_src, f_node] = 0
+            level = 0
+            while len(f_src):
+                level += 1
+                counts = indptr[f_node + 1] - indptr[f_node]
+                total = int(counts.sum())
+                if total == 0:
+                    break
+                # 把每个 frontier 节点的邻居区间拼接成一个扁平数组
+                offsets = np.repeat(indptr[f_node] - np.cumsum(counts) + counts, counts)
+                nb = indices[offsets + np.arange(total)]
+                s_rep = np.repeat(f_src, counts)
+                fresh = sub[s_rep, nb] == -1
+                # 同一 (源, 节点) 可能由多个前驱同时到达，按扁平下标去重
+                flat = np.unique(s_rep[fresh] * n + nb[fresh])
+                f_src, f_node = flat // n, flat % n
+                sub[f_src, f_node] = level
+        return dist
+
+    def _cover_bound(self):
+        n = len(self.node_ids)
+        if len(self.starts) == 0:
+            return 0
+
+        # 从起点集合出发的距离 (reset 之后)
+        d_start = self.dist
+        d_start = np.where(d_start < 0, np.iinfo(np.int32).max, d_start).min(axis=0)
+        reachable = d_start < np.iinfo(np.int32).max
+
+        # 只统计起点可达的边
+        keep = reachable[self.src]
+        src, dst = self.src[keep], self.dst[keep]
+        self.num_edges = len(src)
+
+        # out - in：<0 的节点需要额外走出去，>0 的节点需要额外走进来
+        balance = np.bincount(src, minlength=n) - np.bincount(dst, minlength=n)
+        if not balance.any():
+            return self.num_edges
+
+        # 最小费用流：原图的边 (代价 1，可重复走) + 免费 reset (任意节点 -> R -> 起点)
+        # 稀疏建图，边数 O(E + V)，比 surplus x deficit 的稠密运输问题快得多
+        G = nx.DiGraph()
+        for v in np.nonzero(reachable)[0].tolist():
+            G.add_node(v, demand=int(balance[v]))
+            G.add_edge(v, "reset", weight=0)
+        for u, v in set(zip(src.tolist(), dst.tolist())):
+            if u != v:
+                G.add_edge(u, v, weight=1)
+        for s in self.starts.tolist():
+            G.add_edge("reset", s, weight=0)
+        extra, _ = nx.network_simplex(G)
+        return self.num_edges + int(extra)
+
+    def distance(self, u, v):
+        """两个状态之间的最短步数，不可达返回 -1 (源的距离行第一次用到时才算)"""
+        if u not in self.index or v not in self.index:
+            return -1
+        i = self.index[u]
+        if i not in self._rows:
+            self._rows[i] = self._bfs(self.indptr, self.indices, np.array([i]))[0]
+        return int(self._rows[i][self.index[v]])
+
+def _start_states(env):
+    if hasattr(env, 'get_start_states'):
+        return list(env.get_start_states())
+    state, _ = env.reset()
+    return [state]
+
+def get_coverage_oracle(env):
+    """
+    只对有限图 env 生效：ground truth 的边数等于 get_max_edges()。
+    Hard/Complex 的 ground truth 只包含已探索的边，返回 None。
+    """
+    if not hasattr(env, 'get_ground_truth_graph') or not hasattr(env, 'get_max_edges'):
+        return None
+    transitions = env.get_ground_truth_graph()
+    num_edges = sum(len(acts) for acts in transitions.values())
+    if num_edges == 0 or num_edges != env.get_max_edges():
+        return None
+
+    starts = _start_states(env)
+    signature = (type(env).__name__, tuple(sorted(starts)),
+                 tuple(sorted((s, a, nxt) for s, acts in transitions.items() for a, nxt in acts.items())))
+    if signature not in _ORACLE_CACHE:
+        _ORACLE_CACHE[signature] = CoverageOracle(transitions, starts)
+    return _ORACLE_CACHE[signature]
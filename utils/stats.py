@@ -0,0 +1,164 @@
+import itertools
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+# 各指标默认的置信区间半宽目标 (avg_steps 按 total_budget 的比例给出)
+DEFAULT_CI_TARGET = {
+    "success_rate": 10.0,  # 百分点
+    "avg_cov": 2.0,        # 百分点
+    "avg_steps": 0.02,     # total_budget 的 2%
+}
+
+def z_value(confidence=0.95):
+    """双侧置信水平对应的正态分位数"""
+    return NormalDist().inv_cdf(0.5 + confidence / 2.0)
+
+def _betacf(a, b, x):
+    """不完全 Beta 函数的连分式 (Lentz 算法)"""
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 300):
+        m2 = 2 * m
+        for num in (m * (b - m) * x / ((a + m2 - 1.0) * (a + m2)),
+                    -(a + m) * (a + b + m) * x / ((a + m2) * (a + m2 + 1.0))):
+            d = 1.0 + num * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + num / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1.0) < 1e-12:
+            break
+    return h
+
+def _betainc(a, b, x):
+    """正则化不完全 Beta 函数 I_x(a, b)"""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * _betacf(a, b, x) / a
+    return 1.0 - front * _betacf(b, a, 1.0 - x) / b
+
+def t_cdf(t, df):
+    """Student t 分布的 CDF"""
+    tail = 0.5 * _betainc(df / 2.0, 0.5, df / (df + t * t))
+    return 1.0 - tail if t > 0 else tail
+
+def t_quantile(p, df):
+    """Student t 分布的分位数 (二分法；没有 scipy 依赖)，df 很大时退化为正态分位数"""
+    if df > 1e6:
+        return NormalDist().inv_cdf(p)
+    lo, hi = -1.0, 1.0
+    while t_cdf(lo, df) > p:
+        lo *= 2.0
+    while t_cdf(hi, df) < p:
+        hi *= 2.0
+    for _ in range(100):
+        mid = 0.5 * (lo + hi)
+        if t_cdf(mid, df) < p:
+            lo = mid
+        else:
+            hi = mid
+        if hi - lo < 1e-10 * max(1.0, abs(mid)):
+            break
+    return 0.5 * (lo + hi)
+
+def mean_halfwidth(samples, confidence=0.95):
+    """均值的置信区间半宽 (t 分位数，小样本时比正态近似宽)"""
+    n = len(samples)
+    if n < 2:
+        return float("inf")
+    return t_quantile(0.5 + confidence / 2.0, n - 1) * np.std(samples, ddof=1) / np.sqrt(n)
+
+def wilson_halfwidth(successes, n, confidence=0.95):
+    """
+    成功率的 Wilson 区间半宽 (单位: 比例 0~1)。
+    相比正态近似，在成功率为 0% / 100% 时不会退化为 0 宽度。
+    """
+    if n == 0:
+        return float("inf")
+    z = z_value(confidence)
+    p = successes / n
+    denom = 1.0 + z * z / n
+    return z / denom * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n))
+
+def summarize_runs(steps_hist, cov_hist, success_hist, confidence=0.95):
+    """把一组 run 的原始记录整理成报告用的统计量 (含置信区间半宽)"""
+    n = len(steps_hist)
+    successes = int(np.sum(success_hist))
+    return {
+        "runs": n,
+        "avg_steps": np.mean(steps_hist),
+        "std_steps": np.std(steps_hist),
+        "avg_cov": np.mean(cov_hist),
+        "success_rate": (successes / n) * 100.0,
+        # 样本标准差 (ddof=1)，排名检验用
+        "sd": {
+            "avg_steps": _sd(steps_hist),
+            "avg_cov": _sd(cov_hist),
+            "success_rate": _sd(np.asarray(success_hist, dtype=float) * 100.0),
+        },
+        "ci": {
+            "avg_steps": mean_halfwidth(steps_hist, confidence),
+            "avg_cov": mean_halfwidth(cov_hist, confidence),
+            "success_rate": wilson_halfwidth(successes, n, confidence) * 100.0,
+        },
+    }
+
+def _sd(samples):
+    return float(np.std(samples, ddof=1)) if len(samples) > 1 else float("inf")
+
+def ci_converged(summary, ci_target):
+    """所有指标的半宽都小于目标"""
+    return all(summary["ci"][k] <= v for k, v in ci_target.items())
+
+def spent_alpha(fraction, alpha):
+    """
+    Lan-DeMets 的 O'Brien-Fleming 型 alpha 消耗函数：信息比例 fraction (0~1] 时累计可用的 alpha。
+    早期几乎不花 alpha，fraction=1 时正好花完。
+    """
+    if fraction <= 0:
+        return 0.0
+    z = NormalDist().inv_cdf(1.0 - alpha / 2.0)
+    return 2.0 - 2.0 * NormalDist().cdf(z / math.sqrt(min(fraction, 1.0)))
+
+def look_alpha(n, n_prev, max_runs, alpha):
+    """
+    序贯检验中一次查看 (看的时候每个算法有 n 次 run，上次查看时 n_prev 次) 可用的 alpha：
+    消耗函数在两次查看之间的增量。每次查看按增量检验，所有查看合起来的一类错误不超过 alpha (并集界)。
+    """
+    return spent_alpha(n / max_runs, alpha) - spent_alpha(n_prev / max_runs, alpha)
+
+def pair_settled(a, b, alpha, metric="avg_steps"):
+    """
+    两个算法在主指标 metric 上是否可区分：Welch t 检验，双侧显著性水平 alpha。
+    """
+    na, nb = a["runs"], b["runs"]
+    if na < 2 or nb < 2:
+        return False
+    diff = abs(a[metric] - b[metric])
+    va, vb = a["sd"][metric] ** 2 / na, b["sd"][metric] ** 2 / nb
+    se = math.sqrt(va + vb)
+    if se == 0:
+        # 两边都没有方差：均值不同就是确定的差别
+        return diff > 0
+    # Welch-Satterthwaite 自由度
+    df = (va + vb) ** 2 / ((va ** 2 / (na - 1) if va else 0.0) + (vb ** 2 / (nb - 1) if vb else 0.0))
+    return diff > t_quantile(1.0 - alpha / 2.0, df) * se
+
+def ranking_settled(summaries, alpha, metric="avg_steps"):
+    """
+    所有两两组合在主指标上都已可区分。alpha 是这次查看可用的 alpha (见 look_alpha)，
+    再按组合数 Bonferroni 拆分，"排名已确定" 的误判概率不超过 alpha。
+    """
+    names = list(summaries.keys())
+    if len(names) < 2 or alpha <= 0:
+        return False
+    pairs = list(itertools.combinations(names, 2))
+    return all(pair_settled(summaries[x], summaries[y], alpha / len(pairs), metric) for x, y in pairs)
@@ -0,0 +1,97 @@
+import time
+
+# 计预算的步分四类；reset / 回放不计预算，单独计数
+STEP_KINDS = ("new_edge", "repeat", "shortcut", "truncation_loss")
+
+def _no_phase(name):
+    pass
+
+def phase_timer(env):
+    """算法里用：env 带 profiler 时返回 profiler.phase，否则返回空函数"""
+    profiler = getattr(env, 'profiler', None)
+    return profiler.phase if profiler is not None else _no_phase
+
+class StepProfiler:
+    """
+    浪费步数归因：每一步花在哪了。
+
+    计预算的步 (EnvMonitor.step / shortcut_step)：
+    - new_edge: 探索到新边
+    - shortcut: 智能回溯走的已知捷径 (DFS 通过 EnvMonitor.shortcut_step 标记)
+    - repeat: 走已探索过的边
+    - truncation_loss: episode 被截断时，本 episode 最后一次发现新边之后的重复步
+      (从 repeat 里移过来：这些步没带来新边，走到深度上限就作废了)
+    不计预算的操作：resets / replays (回放步数，MemoizedEnv 跳过的不算)。
+
+    phase(name) 把从上次切换到现在的耗时记到上一个阶段上，算法在阶段之间调用 (见 phase_timer)。
+    每步只有几次整数加法，phase 每次一个 perf_counter，可以常开。
+    """
+    def __init__(self):
+        self.counts = dict.fromkeys(STEP_KINDS, 0)
+        self.resets = 0
+        self.replays = 0
+        self.phase_time = {}
+        self._since_new = 0 # 本 episode 最后一次发现新边之后的重复步数
+        self._phase = None
+        self._phase_start = 0.0
+
+    def on_step(self, new_edge, truncated, shortcut=False):
+        if new_edge:
+            self.counts["new_edge"] += 1
+            self._since_new = 0
+        elif shortcut:
+            self.counts["shortcut"] += 1
+        else:
+            self.counts["repeat"] += 1
+            self._since_new += 1
+        if truncated:
+            self.counts["repeat"] -= self._since_new
+            self.counts["truncation_loss"] += self._since_new
+            self._since_new = 0
+
+    def on_steps(self, new_edges, repeats):
+        """并行 runner 按批汇总 worker 的步：只知道新边数和其余步数，不区分截断损失"""
+        self.counts["new_edge"] += new_edges
+        self.counts["repeat"] += repeats
+
+    def on_reset(self):
+        self.resets += 1
+        self._since_new = 0
+
+    def on_resets(self, n):
+        self.resets += n
+
+    def on_replay(self, n=1):
+        self.replays += n
+
+    def phase(self, name):
+        now = time.perf_counter()
+        if self._phase is not None:
+            self.phase_time[self._phase] = self.phase_time.get(self._phase, 0.0) + now - self._phase_start
+        self._phase = name
+        self._phase_start = now
+
+    def stop(self):
+        self.phase(None)
+
+    def get_stats(self, total_steps=None):
+        """total_steps: EnvMonitor 的步数；和已归类步数的差 (没有经过 profiler 归类的步) 记为 untracked"""
+        stats = dict(self.counts)
+        stats["resets"] = self.resets
+        stats["replays"] = self.replays
+        if total_steps is not None:
+            stats["untracked"] = max(0, total_steps - sum(self.counts.values()))
+        stats["phase_time"] = dict(self.phase_time)
+        return stats
+
+    # === checkpoint：总量很小，整体写入快照 ===
+    def state_dict(self):
+        return {"counts": dict(self.counts), "resets": self.resets, "replays": self.replays,
+                "phase_time": dict(self.phase_time)}
+
+    def load_state_dict(self, state):
+        self.counts = dict(state["counts"])
+        self.resets = state["resets"]
+        self.replays = state["replays"]
+        self.phase_time = dict(state["phase_time"])
+        self._since_new = 0
@@ -5,7 +5,10 @@ import numpy as np
 import os
 import shutil
 import imageio.v2 as imageio
+from collections import deque
 from datetime import datetime
+from matplotlib.collections import LineCollection
+from utils.layout import LayoutEngine, layout_cache_key
 
 # ==========================================
 # [兼容性补丁] 解决 networkx 与 matplotlib 版本冲突
@@ -15,77 +18,224 @@ if not hasattr(matplotlib.cbook, "iterable"):
 # ==========================================
 
 class GraphAnimator:
-    def __init__(self, env, temp_dir="temp_frames"):
+    def __init__(self, env, temp_dir="temp_frames", output_dir=None, filename_prefix="exploration",
+                 fps=2, frame_stride=1, max_frames=None, skip_duplicates=True,
+                 layout_cache=None, lod_threshold=80, lod_edge_threshold=160, lod_hops=2, lod_max_nodes=40, lod_frontier=20, lod_grid=12):
+        """
+        output_dir 不为 None 时启用流式编码：每帧在内存中渲染后直接追加到增量 writer，
+        不创建 temp_dir，也不在内存中保留历史帧。
+        frame_stride: 每 N 次 capture 只编码 1 帧 (抽帧)，最后一帧在收尾时补上。
+        max_frames: 最多编码的帧数，超出后忽略。
+        skip_duplicates: 当前状态和覆盖边数都没变时跳过该帧。
+        layout_cache: 布局缓存目录，每张 env 图一个文件 (见 utils/layout.py)，None 时不落盘。
+        lod_*: 已知节点超过 lod_threshold，或已探索的相连节点对超过 lod_edge_threshold 时按细节层级绘制：只画当前状态 lod_hops 跳内的邻域
+            (最多 lod_max_nodes 个) 和离它最近的 lod_frontier 个 frontier 状态，
+            其余节点按 lod_grid x lod_grid 网格聚合成簇。
+            图结构由 EnvMonitor 的新边通知增量维护，每帧的开销只和可见元素个数有关，不随图变大而增长。
+        """
         self.env = env
         self.temp_dir = temp_dir
         self.frame_count = 0
         self.images = []
         
+        # 流式编码参数
+        self.output_dir = output_dir
+        self.filename_prefix = filename_prefix
+        self.fps = fps
+        self.frame_stride = max(1, int(frame_stride))
+        self.max_frames = max_frames
+        self.skip_duplicates = skip_duplicates
+        self.output_path = None
+        self._writer = None
+        self._capture_calls = 0
+        self._last_key = None
+        self._pending = None # 被抽帧丢掉的最近一次 capture 参数
+        
         # 初始化图结构
         self.G_static = nx.DiGraph()
         
-        # 初始化布局字典
-        self.fixed_pos = {}
-        
-        # 预设 Toy Case 的布局 (美观优先)
+        # 预设 Toy Case 的布局 (美观优先)；Hard Case 的 Success 放远一点
         self.toy_layout = {
             "Home": (0, 0),
             "List": (1, 0),
-            "Detail": (2, 0)
+            "Detail": (2, 0),
+            "Success": (5, 1)
         }
         
-        # 初始化目录
-        if os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
-        os.makedirs(self.temp_dir)
+        # 增量布局引擎：只给新节点算坐标，有缓存时直接读
+        self.layout = LayoutEngine(pinned=self.toy_layout)
+        self.layout_path = None
+        if layout_cache is not None:
+            self.layout_path = os.path.join(layout_cache, f"layout_{layout_cache_key(env)}.npz")
+            self.layout.load(self.layout_path)
+        self.fixed_pos = self.layout.pos
+        
+        # 细节层级 (LOD) 参数
+        self.lod_threshold = lod_threshold
+        self.lod_edge_threshold = lod_edge_threshold
+        self.lod_hops = lod_hops
+        self.lod_max_nodes = lod_max_nodes
+        self.lod_frontier = lod_frontier
+        self.lod_grid = lod_grid
+        
+        # 增量维护的图结构：已知节点 (下标 <-> 状态 id、坐标)、已探索邻接表、每个节点已探索的动作数
+        self._ids = []
+        self._index = {}
+        self._xy = np.empty((64, 2))
+        self._adj = {}
+        self._n_links = 0 # _adj 里的无向节点对数 (高分支的图节点不多、边很多，也要切到 LOD)
+        self._out_count = {}
+        self._frontier = set()
+        self._seen_edges = set()
+        self._new_edges = []
+        self._clusters = None # (计算时的节点数, 簇中心, 簇大小)
+        # 节点名：env 提供单个状态的 node_name 时不用每次重建整个 node_names
+        node_name = getattr(env, 'node_name', None)
+        self._name = node_name if node_name is not None else (lambda s: self.env.node_names.get(s, str(s)))
+        # EnvMonitor 推送新边；推送不到的 (并行 runner 直接合并、checkpoint 恢复) 由边数对不上时补扫
+        listeners = getattr(env, 'edge_listeners', None)
+        if listeners is not None:
+            listeners.append(self._on_new_edge)
+        
+        # 初始化目录 (流式模式不需要临时 PNG 目录)
+        if self.output_dir is None:
+            if os.path.exists(self.temp_dir):
+                shutil.rmtree(self.temp_dir)
+            os.makedirs(self.temp_dir)
+
+    @property
+    def streaming(self):
+        return self.output_dir is not None
+
+    def _on_new_edge(self, state, action, next_state):
+        self._new_edges.append((state, action, next_state))
 
-    def _update_layout(self):
+    def _update_layout(self, current_state_id):
         """
-        [核心修复] 动态更新图节点和坐标。
-        在每帧绘制前调用，确保新发现的节点(Month_X)有坐标。
+        绘制前同步图结构：只处理上一帧以来的新边，新节点交给布局引擎 (前驱就是带出它的那条边的起点)。
         """
-        # 获取当前环境所有已知的节点名字
-        current_names = self.env.node_names # 这是一个 dict {id: "name"}
-        
-        # 1. 将新节点加入图
-        for s_id, name in current_names.items():
-            if name not in self.fixed_pos:
-                self.G_static.add_node(name)
-                
-                # 2. 动态分配坐标
-                if name in self.toy_layout:
-                    # 如果是 Toy Case 的节点，用预设坐标
-                    self.fixed_pos[name] = self.toy_layout[name]
-                elif name == "Success":
-                    # Hard Case: Success 放远一点，或者放在上面
-                    self.fixed_pos[name] = (5, 1) 
-                elif "Month_" in name:
-                    # Hard Case: 陷阱节点按 ID 往右排
-                    # Month_1 -> (1, 0), Month_2 -> (2, 0)...
-                    # 解析 ID: "Month_5" -> 5
-                    try:
-                        m_id = int(name.split("_")[1])
-                        # 为了防止和 Toy Case 重叠，y轴设为 -1
-                        self.fixed_pos[name] = (m_id * 0.8, -0.5) 
-                    except:
-                        self.fixed_pos[name] = (len(self.fixed_pos), -0.5)
-                else:
-                    # 其他未知节点，默认往右排
-                    self.fixed_pos[name] = (len(self.fixed_pos), 0)
+        explored = self.env.explored_edges
+        if len(self._seen_edges) + len(self._new_edges) != len(explored):
+            # 有没推送过来的边：退回按 ground truth 补扫一次
+            transitions = self.env.get_ground_truth_graph()
+            pushed = set((s, a) for s, a, _ in self._new_edges)
+            for s, a in explored - self._seen_edges - pushed:
+                nxt = transitions.get(s, {}).get(a)
+                if nxt is not None:
+                    self._new_edges.append((s, a, nxt))
+        
+        new_nodes, new_links = [], []
+        def see(s, parent=None):
+            if s in self._index:
+                return
+            self._index[s] = len(self._ids)
+            self._ids.append(s)
+            self._frontier.add(s)
+            new_nodes.append(self._name(s))
+            if parent is not None:
+                new_links.append((self._name(parent), self._name(s)))
+        
+        n_actions = self.env.action_space.n
+        for s, a, nxt in self._new_edges:
+            if (s, a) in self._seen_edges:
+                continue
+            self._seen_edges.add((s, a))
+            see(s)
+            see(nxt, s)
+            self._out_count[s] = self._out_count.get(s, 0) + 1
+            if self._out_count[s] >= n_actions:
+                self._frontier.discard(s)
+            if nxt != s and nxt not in self._adj.get(s, ()):
+                self._n_links += 1
+                self._adj.setdefault(s, set()).add(nxt)
+                self._adj.setdefault(nxt, set()).add(s)
+        self._new_edges = []
+        see(current_state_id)
+        
+        if new_nodes:
+            self.layout.place(new_nodes, new_links)
+            n = len(self._ids)
+            if n > len(self._xy):
+                self._xy = np.concatenate([self._xy, np.empty((max(n, 2 * len(self._xy)) - len(self._xy), 2))])
+            first = n - len(new_nodes)
+            self._xy[first:n] = self.layout.positions(new_nodes)
 
     def capture_frame(self, current_state_id, step_num, reward=None):
+        self._capture_calls += 1
+        
+        # 状态和覆盖率都没变化：画出来也是同一张图，直接跳过
+        key = (current_state_id, len(self.env.explored_edges))
+        if self.skip_duplicates and key == self._last_key:
+            return
+        if self.max_frames is not None and self.frame_count >= self.max_frames:
+            return
+        # 抽帧：先记下来，收尾时如果是最后一帧再补画
+        if (self._capture_calls - 1) % self.frame_stride != 0:
+            self._pending = (current_state_id, step_num, reward)
+            return
+        
+        self._pending = None
+        self._last_key = key
+        self._draw_frame(current_state_id, step_num, reward)
+
+    def _draw_frame(self, current_state_id, step_num, reward=None):
         # [步骤 1] 绘制前先同步最新的节点和坐标
-        self._update_layout()
+        self._update_layout(current_state_id)
         
-        plt.figure(figsize=(10, 6)) # 画布调大一点
+        fig = plt.figure(figsize=(10, 6)) # 画布调大一点
         
-        transitions = self.env.get_ground_truth_graph()
         explored = self.env.explored_edges
-        names = self.env.node_names
+        if len(self._ids) > self.lod_threshold or self._n_links > self.lod_edge_threshold:
+            lod_note = self._draw_lod(fig.gca(), current_state_id)
+        else:
+            lod_note = ""
+            self._draw_full(current_state_id, explored)
+
+        # 标题信息
+        cov_percent = 0
+        if hasattr(self.env, 'get_max_edges'):
+            # 对于 Hard Case，get_max_edges 是虚数，不展示百分比，只展示状态
+            max_e = self.env.get_max_edges()
+            if max_e > 100: # 假设是个很大数
+                title_str = f"Step: {step_num} | Trap Depth: {current_state_id}"
+            else:
+                cov_percent = (len(explored) / max_e) * 100
+                title_str = f"Step: {step_num} | Coverage: {cov_percent:.1f}%"
+        else:
+            title_str = f"Step: {step_num}"
+            
+        plt.title(title_str + lod_note)
+        plt.axis('off')
+        plt.tight_layout()
+
+        # 保存
+        if self.streaming:
+            # 直接从 Agg 画布取像素，避免 PNG 落盘再读回
+            fig.canvas.draw()
+            frame = np.asarray(fig.canvas.buffer_rgba())[..., :3]
+            self._get_writer().append_data(frame)
+        else:
+            filename = os.path.join(self.temp_dir, f"frame_{self.frame_count:04d}.png")
+            plt.savefig(filename, dpi=100)
+        plt.close(fig)
+        self.frame_count += 1
+
+    def _draw_full(self, current_state_id, explored):
+        """小图：画出所有节点和 ground truth 边 (未探索的边画成虚线)"""
+        transitions = self.env.get_ground_truth_graph()
+        names = self.env.node_names # 这是一个 dict {id: "name"}
+        visible = list(names.values())
+        visible_set = set(visible)
+        # 预设 / ground truth 里还没见过的节点 (例如 Hard 的 Success) 也要有坐标
+        missing = [n for n in visible if n not in self.layout]
+        if missing:
+            self.layout.place(missing, [(names.get(s, str(s)), names.get(nxt, str(nxt)))
+                                        for s, acts in transitions.items() for nxt in acts.values()])
+        self.G_static.add_nodes_from(visible)
         
         # [步骤 2] 绘制节点
         # 普通节点
-        nx.draw_networkx_nodes(self.G_static, self.fixed_pos, 
+        nx.draw_networkx_nodes(self.G_static, self.fixed_pos, nodelist=visible,
                                node_size=1500, node_color='lightyellow', edgecolors='gray')
         
         # 高亮当前节点
@@ -97,63 +247,153 @@ class GraphAnimator:
                                    node_size=2000, node_color='orange', edgecolors='black', linewidths=2)
         
         # 标签
-        nx.draw_networkx_labels(self.G_static, self.fixed_pos, font_size=8, font_weight="bold")
+        nx.draw_networkx_labels(self.G_static, self.fixed_pos, labels={n: n for n in visible},
+                                font_size=8, font_weight="bold")
 
-        # [步骤 3] 绘制边
+        # [步骤 3] 绘制边：同一对节点只画一条 (有一条已探索就算已探索)，所有边一次画完
+        explored_pair = {}
         for s, actions in transitions.items():
+            u = names.get(s, str(s))
+            if u not in visible_set:
+                continue
             for a, next_s in actions.items():
-                # 获取名字
-                u = names.get(s, str(s))
                 v = names.get(next_s, str(next_s))
-                
-                # 如果某个节点还没坐标（极罕见），跳过不画防止报错
-                if u not in self.fixed_pos or v not in self.fixed_pos:
-                    continue
+                # 只画当前已知的节点之间的边 (布局缓存里可能有这次还没见过的节点)
+                if v in visible_set:
+                    explored_pair[(u, v)] = explored_pair.get((u, v), False) or (s, a) in explored
+        # 逐条 FancyArrowPatch 的开销随边数增长：线段用一个 LineCollection，箭头用一个 quiver，
+        # 自环画成节点外的一圈 (一次 scatter)
+        links = [e for e in explored_pair if e[0] != e[1]]
+        loops = [e for e in explored_pair if e[0] == e[1]]
+        color = lambda e: 'green' if explored_pair[e] else 'lightgray'
+        if links:
+            nx.draw_networkx_edges(
+                self.G_static, self.fixed_pos, edgelist=links, arrows=False,
+                edge_color=[color(e) for e in links],
+                width=[2.0 if explored_pair[e] else 1.0 for e in links],
+                style=['solid' if explored_pair[e] else 'dotted' for e in links]
+            )
+            uv = np.array([(self.fixed_pos[u], self.fixed_pos[v]) for u, v in links], dtype=float)
+            d = uv[:, 1] - uv[:, 0]
+            tail = uv[:, 0] + 0.55 * d
+            plt.quiver(tail[:, 0], tail[:, 1], 0.15 * d[:, 0], 0.15 * d[:, 1], color=[color(e) for e in links],
+                       angles='xy', scale_units='xy', scale=1, width=0.004, headwidth=5, headlength=6, zorder=2)
+        if loops:
+            xy = np.array([self.fixed_pos[u] for u, _ in loops], dtype=float)
+            plt.scatter(xy[:, 0], xy[:, 1], s=2600, facecolors='none', edgecolors=[color(e) for e in loops],
+                        linewidths=1.5, zorder=0)
 
-                # 样式
-                if (s, a) in explored:
-                    color = 'green'; width = 2.0; style = 'solid'
-                else:
-                    color = 'lightgray'; width = 1.0; style = 'dotted'
-                
-                # 自环处理
-                connection_style = "arc3,rad=2.0" if u == v else "arc3,rad=0.2"
-                
-                try:
-                    nx.draw_networkx_edges(
-                        self.G_static, self.fixed_pos,
-                        edgelist=[(u, v)],
-                        edge_color=color, width=width, style=style,
-                        connectionstyle=connection_style, arrowsize=15
-                    )
-                except KeyError:
-                    # 双重保险：万一 networkx 还是找不到 key，忽略这条边
-                    pass
+    def _draw_lod(self, ax, current_state_id):
+        """
+        大图：当前状态的邻域 + 图上最近的 frontier 画成节点，其余节点按网格聚合成簇。
+        邻域 / frontier 都从当前状态出发在邻接表上有界地 BFS，簇只在节点数增长超过 5% 时重算，
+        所有节点 / 边各用一次 scatter / LineCollection，每帧开销只取决于可见元素个数。
+        返回标题后缀。
+        """
+        # 邻域：lod_hops 跳内最多 lod_max_nodes 个；frontier：同一次 BFS 里最近的 lod_frontier 个
+        depth = {current_state_id: 0}
+        near, frontier = [], []
+        queue = deque([current_state_id])
+        budget = 50 * (self.lod_max_nodes + self.lod_frontier) # BFS 最多看这么多个节点
+        while queue and budget > 0:
+            s = queue.popleft()
+            if len(frontier) >= self.lod_frontier and (len(near) >= self.lod_max_nodes or depth[s] >= self.lod_hops):
+                break
+            for nxt in self._adj.get(s, ()):
+                if nxt in depth:
+                    continue
+                budget -= 1
+                depth[nxt] = depth[s] + 1
+                queue.append(nxt)
+                if depth[nxt] <= self.lod_hops and len(near) < self.lod_max_nodes:
+                    near.append(nxt)
+                elif nxt in self._frontier and len(frontier) < self.lod_frontier:
+                    frontier.append(nxt)
+        visible = set(near) | set(frontier)
+        visible.add(current_state_id)
+        
+        # 簇：所有节点按网格聚合 (可见节点画在簇上面)
+        n = len(self._ids)
+        if self._clusters is None or n > self._clusters[0] * 1.05:
+            xy = self._xy[:n]
+            lo, hi = xy.min(axis=0), xy.max(axis=0)
+            cell = np.maximum((hi - lo) / self.lod_grid, 1e-9)
+            bins = np.minimum(((xy - lo) / cell).astype(np.int64), self.lod_grid - 1)
+            keys, inverse, counts = np.unique(bins[:, 0] * self.lod_grid + bins[:, 1],
+                                              return_inverse=True, return_counts=True)
+            centers = np.zeros((len(keys), 2))
+            np.add.at(centers, inverse.reshape(-1), xy)
+            centers /= counts[:, None]
+            self._clusters = (n, centers, counts)
+        _, centers, counts = self._clusters
+        ax.scatter(centers[:, 0], centers[:, 1], s=40 + 20 * np.sqrt(counts), c='lightsteelblue',
+                   alpha=0.6, edgecolors='none', zorder=1)
+        
+        pos = lambda s: self._xy[self._index[s]]
+        # 可见节点之间已探索的边 (一次画完)
+        segments = [(pos(s), pos(nxt)) for s in visible for nxt in self._adj.get(s, ())
+                    if nxt in visible and s < nxt]
+        if segments:
+            ax.add_collection(LineCollection(segments, colors='green', linewidths=1.5, zorder=2))
+        
+        # 节点：邻域 / frontier / 当前状态
+        if near:
+            xy = np.array([pos(s) for s in near])
+            ax.scatter(xy[:, 0], xy[:, 1], s=300, c='lightyellow', edgecolors='gray', zorder=3)
+        if frontier:
+            xy = np.array([pos(s) for s in frontier])
+            ax.scatter(xy[:, 0], xy[:, 1], s=120, c='white', edgecolors='tomato', linewidths=1.5, zorder=3)
+        x, y = pos(current_state_id)
+        ax.scatter([x], [y], s=450, c='orange', edgecolors='black', linewidths=2, zorder=4)
+        for s in near:
+            x, y = pos(s)
+            ax.text(x, y, self._name(s), fontsize=7, ha='center', va='center', zorder=5)
+        ax.autoscale_view()
+        return f" | LOD: {len(visible)}/{n} nodes, {len(counts)} clusters"
 
-        # 标题信息
-        cov_percent = 0
-        if hasattr(self.env, 'get_max_edges'):
-            # 对于 Hard Case，get_max_edges 是虚数，不展示百分比，只展示状态
-            max_e = self.env.get_max_edges()
-            if max_e > 100: # 假设是个很大数
-                title_str = f"Step: {step_num} | Trap Depth: {current_state_id}"
+    def _get_writer(self):
+        """第一帧到来时才打开 writer，格式由扩展名决定 (.gif / .mp4 等)"""
+        if self._writer is None:
+            if not os.path.exists(self.output_dir):
+                os.makedirs(self.output_dir)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            prefix, ext = os.path.splitext(self.filename_prefix)
+            ext = ext or ".gif"
+            self.output_path = os.path.join(self.output_dir, f"{prefix}_{timestamp}{ext}")
+            if ext == ".gif":
+                self._writer = imageio.get_writer(self.output_path, mode='I', duration=1.0/self.fps, loop=0)
             else:
-                cov_percent = (len(explored) / max_e) * 100
-                title_str = f"Step: {step_num} | Coverage: {cov_percent:.1f}%"
-        else:
-            title_str = f"Step: {step_num}"
-            
-        plt.title(title_str)
-        plt.axis('off')
-        plt.tight_layout()
+                self._writer = imageio.get_writer(self.output_path, fps=self.fps)
+        return self._writer
 
-        # 保存
-        filename = os.path.join(self.temp_dir, f"frame_{self.frame_count:04d}.png")
-        plt.savefig(filename, dpi=100)
-        plt.close()
-        self.frame_count += 1
+    def close(self):
+        """流式模式收尾：补上被抽帧跳过的最后一帧，然后关闭 writer"""
+        if self._pending is not None:
+            current_state_id, step_num, reward = self._pending
+            self._pending = None
+            key = (current_state_id, len(self.env.explored_edges))
+            under_cap = self.max_frames is None or self.frame_count < self.max_frames
+            if under_cap and not (self.skip_duplicates and key == self._last_key):
+                self._last_key = key
+                self._draw_frame(current_state_id, step_num, reward)
+        
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            print(f"[Animator] Animation saved to: {self.output_path}")
+        self.save_layout()
 
-    def create_gif(self, folder_name, filename_prefix="exploration", fps=2):
+    def save_layout(self):
+        """把新算出来的坐标写回布局缓存 (没有新节点时不写)"""
+        if self.layout_path is not None:
+            self.layout.save(self.layout_path)
+
+    def create_gif(self, folder_name=None, filename_prefix="exploration", fps=2):
+        # 流式模式下帧已经编码完成，只需关闭 writer
+        if self.streaming:
+            self.close()
+            return
+        
         save_dir = folder_name
         if not os.path.exists(save_dir):
             os.makedirs(save_dir)
@@ -167,6 +407,7 @@ class GraphAnimator:
         frames = [imageio.imread(img) for img in self.images]
         imageio.mimsave(gif_path, frames, duration=1.0/fps, loop=0)
         print(f"[Animator] GIF saved to: {gif_path}")
+        self.save_layout()
         
         try: shutil.rmtree(self.temp_dir)
-        except: pass
\ No newline at end of file
+        except: pass